@@ -0,0 +1,174 @@
+import asyncio
+import re
+import threading
+import time
+from typing import Optional
+from aiogram import types
+from config import DOWNLOAD_BANDWIDTH, UPLOAD_BANDWIDTH, JOB_WEIGHTS
+
+_SIZE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?\s*$', re.I)
+_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_rate(text: str) -> int:
+    """
+    Parse a bytes/sec value such as '512K', '5M' or '0' (unlimited).
+    """
+    m = _SIZE.match(text)
+    if not m:
+        raise ValueError(f"Invalid rate: {text}")
+    return int(float(m.group(1)) * _UNITS[m.group(2).lower()])
+
+
+def format_rate(rate: Optional[float]) -> str:
+    if not rate:
+        return 'unlimited'
+    for unit in ('G', 'M', 'K'):
+        if rate >= _UNITS[unit.lower()]:
+            return f"{rate / _UNITS[unit.lower()]:.1f} {unit}B/s"
+    return f"{rate:.0f} B/s"
+
+
+class Lease:
+    """
+    One job's slice of a BandwidthPool. rate is None while the pool is unlimited.
+    The rate is read on every delay() call, so pacing follows share changes at once.
+    """
+
+    def __init__(self, pool, weight: float):
+        self.pool = pool
+        self.weight = weight
+        self.rate = None
+        self._next = 0.0
+
+    def delay(self, nbytes: int) -> float:
+        """
+        Seconds to wait before sending nbytes so this job stays within its rate.
+        """
+        rate = self.rate
+        if not rate:
+            return 0.0
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + nbytes / rate
+        return start - now
+
+    def release(self) -> None:
+        self.pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class BandwidthPool:
+    """
+    Splits a bytes/sec budget across active jobs in proportion to their weights.
+    """
+
+    def __init__(self, name: str, limit: int = 0):
+        self.name = name
+        self.limit = limit
+        self._leases = []
+        self._lock = threading.Lock()
+
+    def acquire(self, weight: float = 1) -> Lease:
+        lease = Lease(self, weight)
+        with self._lock:
+            self._leases.append(lease)
+            self._rebalance()
+        return lease
+
+    def release(self, lease: Lease) -> None:
+        with self._lock:
+            if lease in self._leases:
+                self._leases.remove(lease)
+                self._rebalance()
+
+    def set_limit(self, limit: int) -> None:
+        """
+        Change the budget; active jobs pick up their new share immediately.
+        """
+        with self._lock:
+            self.limit = limit
+            self._rebalance()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'jobs': len(self._leases),
+                'rates': [int(lease.rate) if lease.rate else None for lease in self._leases],
+            }
+
+    def _rebalance(self) -> None:
+        total = sum(lease.weight for lease in self._leases)
+        for lease in self._leases:
+            lease.rate = self.limit * lease.weight / total if self.limit else None
+
+
+class DownloadPacer:
+    """
+    yt-dlp progress hook that holds a lease of `pool` only while a file is being transferred
+    and paces the transfer against it. yt-dlp calls progress hooks on every block of plain HTTP
+    and fragmented (HLS/DASH) downloads, so share changes reach running downloads on their next
+    block, and extraction, merging and postprocessing hold no share. Downloads yt-dlp hands to
+    ffmpeg report no blocks and are not paced.
+    """
+
+    def __init__(self, pool: BandwidthPool, weight: float = 1):
+        self.pool = pool
+        self.weight = weight
+        self.lease = None
+        self._downloaded = 0
+
+    def hook(self, d: dict) -> None:
+        if d.get('status') != 'downloading':
+            # One part is done (or failed); a following part takes a new lease
+            self.release()
+            return
+        downloaded = d.get('downloaded_bytes') or 0
+        if self.lease is None:
+            self.lease = self.pool.acquire(self.weight)
+            # Bytes resumed from an earlier run were not transferred now
+            self._downloaded = downloaded
+            return
+        wait = self.lease.delay(max(0, downloaded - self._downloaded))
+        self._downloaded = downloaded
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self) -> None:
+        if self.lease is not None:
+            self.lease.release()
+            self.lease = None
+
+
+class ThrottledInputFile(types.FSInputFile):
+    """
+    FSInputFile that paces its upload against a share of upload_pool.
+    The share is taken when the upload starts reading and returned when it ends.
+    """
+
+    def __init__(self, path, kind: str = 'video', filename: Optional[str] = None):
+        super().__init__(path, filename=filename)
+        self.kind = kind
+
+    async def read(self, bot):
+        with upload_pool.acquire(JOB_WEIGHTS.get(self.kind, 1)) as lease:
+            async for chunk in super().read(bot):
+                wait = lease.delay(len(chunk))
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                yield chunk
+
+
+def bandwidth_status() -> dict:
+    return {'download': download_pool.snapshot(), 'upload': upload_pool.snapshot()}
+
+
+# Global instances
+download_pool = BandwidthPool('download', DOWNLOAD_BANDWIDTH)
+upload_pool = BandwidthPool('upload', UPLOAD_BANDWIDTH)
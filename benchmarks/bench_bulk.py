@@ -0,0 +1,142 @@
+"""
+End-to-end check of the bulk playlist pipeline against a local stand-in playlist.
+
+Serves an RSS feed whose items are direct MP4 files and HLS streams from a local HTTP server,
+runs BulkJob over it with a simulated upload, and reports throughput, the most files that were
+on disk at once and peak memory. No network access or Telegram token is needed.
+
+    python benchmarks/bench_bulk.py [--items N] [--size KB] [--upload-delay S] [--workers W] [--on-disk K]
+
+Disk use should stay at K files and memory should stay flat as --items grows (e.g. 50 vs 500).
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+os.environ['TRACE_FILE'] = ''
+
+from config import TEMP_DIR  # noqa: E402
+from bulk import BulkJob  # noqa: E402
+
+HLS_EVERY = 5  # every Nth item is an HLS stream instead of a direct file
+HLS_SEGMENTS = 4
+
+
+def build_site(root: str, items: int, size: int) -> None:
+    """
+    Write the feed, one MP4 blob linked under a name per item, and an HLS stream.
+    """
+    with open(os.path.join(root, 'blob.mp4'), 'wb') as f:
+        f.write(os.urandom(size))
+    for i in range(HLS_SEGMENTS):
+        with open(os.path.join(root, f'seg{i}.ts'), 'wb') as f:
+            f.write(os.urandom(size // HLS_SEGMENTS))
+    with open(os.path.join(root, 'stream.m3u8'), 'w') as f:
+        f.write('#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:2\n#EXT-X-MEDIA-SEQUENCE:0\n')
+        for i in range(HLS_SEGMENTS):
+            f.write(f'#EXTINF:2.0,\nseg{i}.ts\n')
+        f.write('#EXT-X-ENDLIST\n')
+    for i in range(items):
+        if i % HLS_EVERY:
+            os.link(os.path.join(root, 'blob.mp4'), os.path.join(root, f'item{i}.mp4'))
+
+
+def feed(base: str, items: int) -> str:
+    rows = []
+    for i in range(items):
+        url = f'{base}/stream.m3u8?item={i}' if i % HLS_EVERY == 0 else f'{base}/item{i}.mp4'
+        rows.append(f'<item><title>Item {i}</title><guid>item{i}</guid><link>{url}</link></item>')
+    return ('<?xml version="1.0"?><rss version="2.0"><channel><title>Stand-in playlist</title>'
+            + ''.join(rows) + '</channel></rss>')
+
+
+def serve(root: str) -> str:
+    handler = functools.partial(QuietHandler, directory=root)
+    server = QuietServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(http.server.ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # yt-dlp closes some probe requests early
+        pass
+
+
+def rss_mb() -> float:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+
+
+async def run(args, url: str) -> None:
+    sent = []
+    samples = {'files': 0, 'rss': 0.0}
+    before = set(os.listdir(TEMP_DIR))
+
+    async def send(filepath, info, index):
+        sent.append(index)
+        await asyncio.sleep(args.upload_delay)
+
+    async def sample():
+        while True:
+            files = len(set(os.listdir(TEMP_DIR)) - before)
+            samples['files'] = max(samples['files'], files)
+            samples['rss'] = max(samples['rss'], rss_mb())
+            await asyncio.sleep(0.05)
+
+    job = BulkJob(url, 'video', 'best', send, limit=args.items, workers=args.workers, max_on_disk=args.on_disk)
+    sampler = asyncio.create_task(sample())
+    start = time.perf_counter()
+    first = None
+    task = asyncio.create_task(job.run())
+    while not task.done():
+        if first is None and sent:
+            first = time.perf_counter() - start
+        await asyncio.sleep(0.01)
+    await task
+    elapsed = time.perf_counter() - start
+    sampler.cancel()
+
+    print(f"items listed:        {job.found}")
+    print(f"sent / failed:       {job.sent} / {job.failed}" + (f"  (last error: {job.last_error})" if job.last_error else ''))
+    print(f"total time:          {elapsed:.1f}s ({job.sent / elapsed:.1f} items/s)")
+    print(f"first item sent at:  {first:.2f}s" if first is not None else "first item sent at:  -")
+    print(f"peak items on disk:  {job.peak_on_disk} (limit {args.on_disk}), {samples['files']} temp files incl. fragments")
+    print(f"peak RSS:            {samples['rss']:.1f} MB")
+    leftover = set(os.listdir(TEMP_DIR)) - before
+    print(f"files left behind:   {len(leftover)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk pipeline benchmark")
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--size', type=int, default=512, help="item size in KB")
+    parser.add_argument('--upload-delay', type=float, default=0.02, help="simulated upload time per item")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--on-disk', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        build_site(root, args.items, args.size * 1024)
+        base = serve(root)
+        with open(os.path.join(root, 'feed.xml'), 'w') as f:
+            f.write(feed(base, args.items))
+        asyncio.run(run(args, f'{base}/feed.xml'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+CPU cost of progress reporting at high yt-dlp tick rates.
+
+Runs --jobs download threads that each feed --rate progress events per second into a real
+yt-dlp FileDownloader for --seconds, the way a fast download does, and measures process CPU
+time per job. Status message edits go to a stub that takes --edit-latency seconds.
+
+  legacy    the previous pipeline: yt-dlp formats and prints its progress line, the hook parses
+            _percent_str and builds a dict, the callback builds the bar text and schedules every
+            edit it lets through onto the loop with run_coroutine_threadsafe
+  renderer  JobProgress.hook stores numbers, yt-dlp formats its line once per PROGRESS_INTERVAL,
+            one ProgressRenderer task edits changed messages
+
+    python benchmarks/bench_progress.py [--jobs N] [--rate HZ] [--seconds S]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+os.environ['TRACE_FILE'] = ''
+
+import yt_dlp  # noqa: E402
+from yt_dlp.downloader.common import FileDownloader  # noqa: E402
+from config import PROGRESS_INTERVAL  # noqa: E402
+from progress import ProgressRenderer  # noqa: E402
+
+TOTAL_BYTES = 200 * 1024 * 1024
+
+
+class StubMessage:
+    reply_markup = None
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.edits = 0
+
+    async def edit_text(self, text, reply_markup=None):
+        self.edits += 1
+        await asyncio.sleep(self.latency)
+
+
+def legacy_hooks(message, loop, counters):
+    """
+    The progress hook and callback as they were before the renderer.
+    """
+    last = {'time': 0.0, 'percent': -1.0}
+
+    def cb(data):
+        now = time.time()
+        percent = float(data.get('percent') or 0.0)
+        p = max(0.0, min(100.0, percent))
+        filled = int((p / 100.0) * 25)
+        bar = '▰' * filled + '▱' * (25 - filled)
+        text = f"📥 Downloading: [{bar}] {p:5.1f}% | ⚡ Speed: {data.get('speed', 'N/A')} | ⏱️ ETA: {data.get('eta', 'N/A')}"
+        if now - last['time'] < 1.5 and abs(percent - last['percent']) < 1.0:
+            return
+        last['time'] = now
+        last['percent'] = percent
+        counters['scheduled'] += 1
+        asyncio.run_coroutine_threadsafe(message.edit_text(text), loop)
+
+    def progress_hook(d):
+        if d.get('status') == 'downloading':
+            percent_str = d.get('_percent_str') or d.get('percent') or '0%'
+            try:
+                percent_val = float(str(percent_str).strip().replace('%', ''))
+            except Exception:
+                percent_val = 0.0
+            cb({
+                'status': 'downloading',
+                'percent': percent_val,
+                'percent_str': f"{percent_val:.1f}%",
+                'speed': d.get('_speed_str', d.get('speed')) or 'N/A',
+                'eta': d.get('_eta_str', d.get('eta')) or 'N/A',
+            })
+
+    return progress_hook
+
+
+def downloader(hook, params: dict) -> FileDownloader:
+    fd = FileDownloader(yt_dlp.YoutubeDL(params), params)
+    fd.add_progress_hook(hook)
+    return fd
+
+
+def feed(fd: FileDownloader, rate: int, seconds: float) -> int:
+    """
+    Emit download progress through a FileDownloader the way yt-dlp's HTTP downloader does.
+    """
+    start = time.monotonic()
+    step = TOTAL_BYTES / (rate * seconds)
+    events = 0
+    while True:
+        elapsed = time.monotonic() - start
+        if elapsed >= seconds:
+            break
+        events += 1
+        downloaded = min(TOTAL_BYTES, int(events * step))
+        speed = downloaded / elapsed if elapsed else None
+        fd._hook_progress({
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'total_bytes': TOTAL_BYTES,
+            'tmpfilename': 'x.part',
+            'filename': 'x',
+            'eta': int((TOTAL_BYTES - downloaded) / speed) if speed else None,
+            'speed': speed,
+            'elapsed': elapsed,
+        }, {})
+        time.sleep(1 / rate)
+    return events
+
+
+async def run(mode: str, args) -> dict:
+    loop = asyncio.get_running_loop()
+    messages = [StubMessage(args.edit_latency) for _ in range(args.jobs)]
+    counters = {'scheduled': 0}
+    renderer = ProgressRenderer()
+    events = []
+
+    def job(fd):
+        events.append(feed(fd, args.rate, args.seconds))
+
+    with contextlib.ExitStack() as stack:
+        # yt-dlp binds its output streams when created; send its progress lines nowhere
+        stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+        threads = []
+        for message in messages:
+            if mode == 'legacy':
+                # The previous _download_sync options: quiet, but yt-dlp still renders its progress line
+                params = {'quiet': True, 'no_warnings': True}
+                hook = legacy_hooks(message, loop, counters)
+            else:
+                params = {'quiet': True, 'no_warnings': True, 'noprogress': True, 'progress_delta': PROGRESS_INTERVAL}
+                hook = stack.enter_context(renderer.track(message)).hook
+            threads.append(threading.Thread(target=job, args=(downloader(hook, params),)))
+        cpu_start = time.process_time()
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            await asyncio.sleep(0.05)
+    await asyncio.sleep(args.edit_latency * 2)
+    cpu = time.process_time() - cpu_start
+    return {
+        'events': sum(events),
+        'cpu_per_job': cpu / args.jobs,
+        'edits': sum(m.edits for m in messages),
+        'scheduled': counters['scheduled'] if mode == 'legacy' else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Progress reporting CPU benchmark")
+    parser.add_argument('--jobs', type=int, default=20)
+    parser.add_argument('--rate', type=int, default=200, help="progress events per second per job")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--edit-latency', type=float, default=0.1, help="simulated edit_text round trip")
+    args = parser.parse_args()
+
+    print(f"{args.jobs} jobs x {args.rate} events/s for {args.seconds:.0f}s\n")
+    print(f"{'mode':<10}{'events/s':>10}{'CPU/job':>10}{'CPU/event':>11}{'edits':>8}{'thread->loop':>14}")
+    for mode in ('legacy', 'renderer'):
+        r = asyncio.run(run(mode, args))
+        rate = r['events'] / args.seconds
+        print(f"{mode:<10}{rate:>10.0f}{r['cpu_per_job'] / args.seconds * 100:>9.2f}%"
+              f"{r['cpu_per_job'] * args.jobs / r['events'] * 1e6:>9.1f}us{r['edits']:>8}{r['scheduled']:>14}")
+
+
+if __name__ == '__main__':
+    main()
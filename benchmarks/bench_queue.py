@@ -0,0 +1,254 @@
+"""
+Multi-worker benchmark for the job queue.
+
+Serves media files from a local HTTP server that caps each connection at --rate bytes/sec
+(like a CDN would) and answers sendVideo from a local stand-in Bot API after --upload-delay
+seconds. For each worker count it starts that many `python worker.py` processes on a fresh queue,
+enqueues --jobs downloads spread over --users users, and reports throughput, CPU per job and
+whether every user's jobs ran one at a time in order. No network access or Telegram token is needed.
+
+    python benchmarks/bench_queue.py [--workers 1,2,4] [--jobs N] [--users U] [--kill]
+
+--kill SIGKILLs one worker in the last run while it holds a job, to check that the job is run
+again by another worker once its lease expires.
+
+Throughput scales with workers until the machine runs out of CPU; on a single core only the
+waiting on the source and on Telegram overlaps.
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import os
+import shutil
+import signal
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('BOT_TOKEN', '123456:benchmark')
+os.environ['TRACE_FILE'] = ''
+
+from jobqueue import JobQueue, FINISHED  # noqa: E402
+
+TOKEN = os.environ['BOT_TOKEN']
+VISIBILITY_TIMEOUT = 5  # seconds, short so a killed worker's job comes back quickly
+
+
+class ThrottledHandler(http.server.SimpleHTTPRequestHandler):
+    rate = 1024 * 1024
+
+    def copyfile(self, source, outputfile):
+        chunk = 64 * 1024
+        while True:
+            data = source.read(chunk)
+            if not data:
+                return
+            outputfile.write(data)
+            time.sleep(len(data) / self.rate)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def serve_media(root: str, jobs: int, size: int, rate: int) -> str:
+    with open(os.path.join(root, 'blob.mp4'), 'wb') as f:
+        f.write(os.urandom(size))
+    for i in range(jobs):
+        os.link(os.path.join(root, 'blob.mp4'), os.path.join(root, f'item{i}.mp4'))
+    handler = functools.partial(type('Handler', (ThrottledHandler,), {'rate': rate}), directory=root)
+    server = QuietServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class FakeBotAPI:
+    """
+    Accepts uploads after `delay` seconds and counts them.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.uploads = 0
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        await request.read()
+        await asyncio.sleep(self.delay)
+        if method in ('sendVideo', 'sendAudio'):
+            self.uploads += 1
+        result = {'message_id': self.uploads, 'date': int(time.time()), 'chat': {'id': 1, 'type': 'private'}}
+        return web.json_response({'ok': True, 'result': result})
+
+
+def cpu_seconds(pid: int) -> float:
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+async def start_worker(queue_path: str, api_url: str, polling: asyncio.Queue):
+    env = {**os.environ, 'JOB_QUEUE': queue_path, 'TELEGRAM_API_URL': api_url,
+           'QUEUE_VISIBILITY_TIMEOUT': str(VISIBILITY_TIMEOUT)}
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, 'worker.py', cwd=ROOT, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+
+    async def drain():
+        async for line in process.stderr:
+            if b'processing' in line:
+                await polling.put(process.pid)
+
+    asyncio.create_task(drain())
+    return process
+
+
+async def kill_one(queue_path: str, processes: list) -> tuple:
+    """
+    SIGKILL the first worker seen holding a job; returns (job id, worker pid).
+    """
+    db = sqlite3.connect(queue_path)
+    try:
+        while True:
+            row = db.execute("SELECT id, worker FROM jobs WHERE status = 'running' LIMIT 1").fetchone()
+            if row:
+                pid = int(row[1].rsplit(':', 1)[1])
+                if any(p.pid == pid for p in processes):
+                    os.kill(pid, signal.SIGKILL)
+                    return row[0], pid
+            await asyncio.sleep(0.05)
+    finally:
+        db.close()
+
+
+def check_order(queue_path: str) -> bool:
+    """
+    Every user's jobs started in enqueue order, each after the previous one finished.
+    """
+    db = sqlite3.connect(queue_path)
+    rows = db.execute('SELECT user_id, started, updated FROM jobs ORDER BY user_id, id').fetchall()
+    db.close()
+    for prev, row in zip(rows, rows[1:]):
+        if prev[0] == row[0] and row[1] < prev[2]:
+            return False
+    return True
+
+
+async def run(args, base: str, workers: int, kill: bool) -> dict:
+    api = FakeBotAPI(args.upload_delay)
+    app = web.Application(client_max_size=1024 ** 3)
+    app.router.add_post(f'/bot{TOKEN}/{{method}}', api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    api_url = f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}'
+
+    tmp = tempfile.mkdtemp()
+    queue_path = os.path.join(tmp, 'jobs.db')
+    queue = JobQueue(queue_path)
+    polling = asyncio.Queue()
+    processes = [await start_worker(queue_path, api_url, polling) for _ in range(workers)]
+    try:
+        # Enqueue once every worker is polling, so slow imports don't count against throughput
+        for _ in processes:
+            await asyncio.wait_for(polling.get(), 120)
+        startup_cpu = {p.pid: cpu_seconds(p.pid) for p in processes}
+        for i in range(args.jobs):
+            queue.enqueue(i % args.users, 1, {'url': f'{base}/item{i}.mp4', 'format_type': 'video', 'quality': 'best'})
+        killed = asyncio.create_task(kill_one(queue_path, processes)) if kill else None
+        while True:
+            stats = queue.stats()
+            if sum(count for status, count in stats.items() if status in FINISHED) == args.jobs:
+                break
+            await asyncio.sleep(0.1)
+        # CPU spent on jobs by the workers that lived to the end
+        killed_pid = killed.result()[1] if killed and killed.done() else None
+        alive = [p for p in processes if p.pid != killed_pid]
+        cpu = sum(cpu_seconds(p.pid) - startup_cpu[p.pid] for p in alive)
+    finally:
+        for p in processes:
+            if p.returncode is None:
+                p.terminate()
+        for p in processes:
+            await p.wait()
+        await runner.cleanup()
+
+    db = sqlite3.connect(queue_path)
+    first, last = db.execute('SELECT MIN(started), MAX(updated) FROM jobs').fetchone()
+    done = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'done'").fetchone()[0]
+    failed = db.execute("SELECT error FROM jobs WHERE status != 'done'").fetchall()
+    result = {
+        'workers': workers,
+        'done': done,
+        'elapsed': last - first,
+        'throughput': done / (last - first),
+        'cpu_per_job': cpu / done if done else 0.0,
+        'failed': [row[0] for row in failed],
+        'ordered': check_order(queue_path),
+    }
+    if killed:
+        if killed.done():
+            job_id = killed.result()[0]
+            status, attempts = db.execute('SELECT status, attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            result['killed'] = f"job {job_id}: {status} after {attempts} attempts"
+        else:
+            killed.cancel()
+    db.close()
+    shutil.rmtree(tmp)
+    return result
+
+
+async def measure(args, base: str) -> None:
+    counts = [int(n) for n in args.workers.split(',')]
+    results = []
+    for n in counts:
+        results.append(await run(args, base, n, args.kill and n == counts[-1]))
+    single = results[0]['throughput'] / results[0]['workers']
+    print(f"{args.jobs} jobs of {args.size} KB at {args.rate} KB/s per connection, "
+          f"upload {args.upload_delay * 1000:.0f} ms, {args.users} users, {os.cpu_count()} CPU(s)\n")
+    print(f"{'workers':>7}{'done':>6}{'time':>9}{'jobs/s':>9}{'speedup':>9}{'CPU/job':>10}{'per-user order':>16}")
+    for r in results:
+        speedup = r['throughput'] / single if single else 0.0
+        print(f"{r['workers']:>7}{r['done']:>6}{r['elapsed']:>8.1f}s{r['throughput']:>9.2f}{speedup:>8.2f}x"
+              f"{r['cpu_per_job'] * 1000:>8.0f}ms{'ok' if r['ordered'] else 'VIOLATED':>16}")
+        if r['failed']:
+            print(f"        {len(r['failed'])} job(s) failed, e.g.: {(r['failed'][0] or '').splitlines()[0]}")
+        if 'killed' in r:
+            print(f"        killed one worker: {r['killed']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Job queue multi-worker benchmark")
+    parser.add_argument('--workers', default='1,2,4', help="comma-separated worker counts")
+    parser.add_argument('--jobs', type=int, default=24)
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--size', type=int, default=1024, help="file size in KB")
+    parser.add_argument('--rate', type=int, default=1024, help="source rate per connection in KB/s")
+    parser.add_argument('--upload-delay', type=float, default=0.5, help="simulated upload time in seconds")
+    parser.add_argument('--kill', action='store_true', help="kill a worker mid-job in the last run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        base = serve_media(root, args.jobs, args.size * 1024, args.rate * 1024)
+        asyncio.run(measure(args, base))
+
+
+if __name__ == '__main__':
+    main()
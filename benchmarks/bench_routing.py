@@ -0,0 +1,98 @@
+"""
+Microbenchmark for URL classification throughput.
+
+Compares URLDispatcher.classify against yt-dlp's own first-suitable-extractor scan
+over a mix of common share links. No network access is needed.
+
+    python benchmarks/bench_routing.py [--rounds N] [--verify]
+
+--verify also checks that the index picks the same extractor as the linear scan
+for every test URL shipped with yt-dlp's extractors.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routing import url_dispatcher  # noqa: E402
+
+SAMPLE_URLS = [
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://youtu.be/dQw4w9WgXcQ?si=Zx3kq0',
+    'https://m.youtube.com/watch?v=dQw4w9WgXcQ&utm_source=share',
+    'https://www.youtube.com/shorts/dQw4w9WgXcQ',
+    'https://www.tiktok.com/@user/video/7234567890123456789',
+    'https://vm.tiktok.com/ZMabcdef/',
+    'https://www.instagram.com/p/C1a2b3c4d5e/?igsh=abc',
+    'https://www.instagram.com/reel/C1a2b3c4d5e/',
+    'https://www.facebook.com/watch/?v=1234567890',
+    'https://x.com/user/status/1234567890123456789',
+    'https://www.pinterest.com/pin/123456789012345678/',
+    'https://vimeo.com/76979871',
+    'https://www.reddit.com/r/videos/comments/abc123/some_title/',
+    'https://soundcloud.com/artist/track-name',
+    'https://www.dailymotion.com/video/x7tgad0',
+    'https://example.com/images/photo.jpg',
+    'https://cdn.example.org/clip.mp4',
+    'https://example.com/some/article',
+]
+
+
+def linear_match(extractors, url):
+    for ie in extractors:
+        if ie.suitable(url):
+            return ie
+    return None
+
+
+def bench(label, func, urls, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for url in urls:
+            func(url)
+    elapsed = time.perf_counter() - start
+    count = rounds * len(urls)
+    print(f"{label:<24} {count / elapsed:>12,.0f} urls/s  {elapsed / count * 1e6:>8.1f} us/url")
+
+
+def verify():
+    from yt_dlp.extractor import _extractors
+
+    extractors = url_dispatcher._extractors
+    urls = []
+    for name in dir(_extractors):
+        ie = getattr(_extractors, name)
+        if isinstance(ie, type) and name.endswith('IE'):
+            for test in getattr(ie, '_TESTS', None) or []:
+                if isinstance(test, dict) and str(test.get('url', '')).startswith('http'):
+                    urls.append(test['url'])
+    mismatches = [url for url in urls if url_dispatcher.match(url) is not linear_match(extractors, url)]
+    print(f"verify: {len(urls) - len(mismatches)}/{len(urls)} test URLs routed like yt-dlp")
+    for url in mismatches[:20]:
+        print(f"  mismatch: {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--verify', action='store_true')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    url_dispatcher.build()
+    print(f"index build: {time.perf_counter() - start:.2f}s "
+          f"({len(url_dispatcher._extractors)} extractors, {len(url_dispatcher._wildcard)} unindexed)")
+
+    extractors = url_dispatcher._extractors
+    bench('yt-dlp linear scan', lambda url: linear_match(extractors, url), SAMPLE_URLS, max(1, args.rounds // 10))
+    bench('URLDispatcher.match', url_dispatcher.match, SAMPLE_URLS, args.rounds)
+    bench('URLDispatcher.classify', url_dispatcher.classify, SAMPLE_URLS, args.rounds)
+
+    if args.verify:
+        verify()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Cold-start benchmark: import time and time to first handled update.
+
+Import time is measured in fresh interpreters. Time to first update starts the real bot
+(`python main.py`) against a local stand-in for the Bot API that adds --rtt seconds of latency
+to every call and hands out one /start message; it measures how long after spawning the process
+the bot replies to it, and when /ready first reports ready.
+
+    python benchmarks/bench_startup.py [--runs N] [--rtt SECONDS] [--root CHECKOUT]
+
+--root measures another checkout of the bot, e.g. an older revision for comparison.
+
+The "cold" run starts without a saved description hash (first deploy), the "warm" runs reuse it
+(ordinary restart).
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = '123456:benchmark'
+
+IMPORT_SNIPPET = (
+    "import sys, time; t = time.perf_counter(); import main; "
+    "print(time.perf_counter() - t, int('yt_dlp' in sys.modules))"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def bot_env(api_url: str, port: int, state_file: str) -> dict:
+    return {
+        **os.environ,
+        'BOT_TOKEN': TOKEN,
+        'TELEGRAM_API_URL': api_url,
+        'PORT': str(port),
+        'BOT_STATE_FILE': state_file,
+        'TRACE_FILE': '',
+    }
+
+
+def measure_imports(root: str, runs: int) -> None:
+    env = {**os.environ, 'BOT_TOKEN': TOKEN, 'PORT': str(free_port()), 'TRACE_FILE': ''}
+    times, loaded = [], 0
+    for _ in range(runs):
+        env['PORT'] = str(free_port())
+        out = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=root, env=env,
+                             capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(out[0]))
+        loaded += int(out[1])
+    print(f"import main:            median {statistics.median(times):.3f}s  min {min(times):.3f}s "
+          f"(yt_dlp imported in {loaded}/{runs} runs)")
+    for module in ('aiogram', 'yt_dlp'):
+        out = subprocess.run([sys.executable, '-c', f"import time; t = time.perf_counter(); import {module}; "
+                              f"print(time.perf_counter() - t)"], capture_output=True, text=True, check=True)
+        print(f"  for reference, import {module}: {float(out.stdout):.3f}s")
+
+
+class FakeBotAPI:
+    """
+    Minimal Bot API: answers every method after `rtt` seconds and serves one /start update.
+    """
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.calls = []
+        self.replied = asyncio.Event()
+        self.update_sent = False
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        self.calls.append((time.perf_counter(), method))
+        await asyncio.sleep(self.rtt)
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif method == 'getUpdates':
+            result = []
+            if not self.update_sent:
+                self.update_sent = True
+                result = [{'update_id': 1, 'message': {
+                    'message_id': 1, 'date': int(time.time()), 'text': '/start',
+                    'chat': {'id': 1, 'type': 'private'},
+                    'from': {'id': 1, 'is_bot': False, 'first_name': 'User'},
+                    'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+                }}]
+            else:
+                await asyncio.sleep(0.5)
+        elif method == 'sendMessage':
+            self.replied.set()
+            result = {'message_id': 2, 'date': int(time.time()), 'chat': {'id': 1, 'type': 'private'}, 'text': 'ok'}
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    def count(self, method: str) -> int:
+        return sum(1 for _, name in self.calls if name == method)
+
+
+async def wait_ready(port: int, timeout: float = 60.0):
+    """
+    Return when /ready first answered 200, or None if the checkout has no readiness endpoint.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = time.perf_counter() + timeout
+
+    def probe():
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/ready', timeout=1) as response:
+                return response.status == 200
+        except urllib.error.HTTPError as e:
+            return None if e.code == 404 else False
+        except OSError:
+            return False
+
+    while time.perf_counter() < deadline:
+        state = await loop.run_in_executor(None, probe)
+        if state is None:
+            return None
+        if state:
+            return time.perf_counter()
+        await asyncio.sleep(0.05)
+    raise TimeoutError('bot never became ready')
+
+
+async def start_run(root: str, state_file: str, rtt: float) -> dict:
+    api = FakeBotAPI(rtt)
+    app = web.Application()
+    app.router.add_post(f'/bot{TOKEN}/{{method}}', api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    api_port = free_port()
+    await web.TCPSite(runner, '127.0.0.1', api_port).start()
+
+    health_port = free_port()
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, 'main.py', cwd=root, env=bot_env(f'http://127.0.0.1:{api_port}', health_port, state_file),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready_task = asyncio.create_task(wait_ready(health_port))
+        await asyncio.wait_for(api.replied.wait(), 60)
+        replied = api.calls[-1][0]
+        ready = await ready_task
+    finally:
+        process.terminate()
+        await process.wait()
+        await runner.cleanup()
+    first_poll = next(t for t, name in api.calls if name == 'getUpdates')
+    return {
+        'first_poll': first_poll - start,
+        'first_reply': replied - start,
+        'ready': ready - start if ready else None,
+        'descriptions': api.count('setMyDescription') + api.count('setMyShortDescription'),
+    }
+
+
+async def measure_startup(root: str, runs: int, rtt: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        state_file = os.path.join(tmp, 'bot_state.json')
+        results = [('cold', await start_run(root, state_file, rtt))]
+        for _ in range(runs):
+            results.append(('warm', await start_run(root, state_file, rtt)))
+    print(f"\ntime to first update (Bot API latency {rtt * 1000:.0f} ms per call):")
+    print(f"{'run':<6}{'first getUpdates':>18}{'first reply':>13}{'ready':>9}{'description calls':>19}")
+    for name, r in results:
+        ready = f"{r['ready']:.2f}s" if r['ready'] is not None else '-'
+        print(f"{name:<6}{r['first_poll']:>17.2f}s{r['first_reply']:>12.2f}s{ready:>9}{r['descriptions']:>19}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument('--runs', type=int, default=3, help="import runs and warm restarts")
+    parser.add_argument('--rtt', type=float, default=0.15, help="simulated Bot API latency in seconds")
+    parser.add_argument('--root', default=ROOT, help="bot checkout to measure")
+    args = parser.parse_args()
+    measure_imports(args.root, args.runs)
+    asyncio.run(measure_startup(args.root, args.runs, args.rtt))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Optional
+from config import BREAKER_THRESHOLD, BREAKER_COOLDOWN, RETRY_BASE_DELAY, RETRY_MAX_DELAY, SITE_CONCURRENCY
+
+# Error classes that say something about the site rather than the requested URL
+ERROR_PATTERNS = (
+    ('bot_check', re.compile(r"Sign in to confirm|not a bot", re.I)),
+    ('rate_limited', re.compile(r"HTTP Error 429|Too Many Requests|rate.?limit", re.I)),
+    ('unavailable', re.compile(
+        r"HTTP Error 5\d\d|timed out|Connection (?:reset|refused|aborted)|"
+        r"Temporary failure in name resolution|Remote end closed connection", re.I)),
+)
+
+# Error classes worth retrying after a backoff
+TRANSIENT_ERRORS = {'rate_limited', 'unavailable'}
+
+ERROR_DESCRIPTIONS = {
+    'bot_check': 'the site is asking for a bot check',
+    'rate_limited': 'the site is throttling requests',
+    'unavailable': 'the site is not responding',
+}
+
+
+def classify_error(message: str) -> Optional[str]:
+    """
+    Return the error class of a yt-dlp error message, or None if it only concerns the URL itself
+    (private video, unsupported link, missing format, ...).
+    """
+    for error_class, pattern in ERROR_PATTERNS:
+        if pattern.search(message):
+            return error_class
+    return None
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """
+    Jittered exponential backoff ("full jitter") for the given zero-based retry attempt.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class SourceError(ValueError):
+    """
+    Download failure carrying the error class from classify_error.
+    """
+
+    def __init__(self, message: str, error_class: Optional[str] = None):
+        super().__init__(message)
+        self.error_class = error_class
+
+    @property
+    def transient(self) -> bool:
+        return self.error_class in TRANSIENT_ERRORS
+
+
+class CircuitOpenError(ValueError):
+    """
+    Raised instead of contacting a site whose breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one site.
+    closed: requests pass. open: requests fail fast until the cooldown expires.
+    half_open: a single trial request is let through; its outcome closes or reopens the breaker.
+    Used from both the event loop and executor threads, so state is guarded by a lock.
+    """
+
+    def __init__(self, site: str, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.site = site
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.failures = 0
+        self.error_class = None
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def before_request(self) -> None:
+        """
+        Raise CircuitOpenError if the site should not be contacted right now.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == 'open':
+                remaining = self.cooldown - (now - self.opened_at)
+                if remaining > 0:
+                    raise CircuitOpenError(self._message(remaining))
+                self.state = 'half_open'
+                self.probe_started = now
+            elif self.state == 'half_open':
+                # Another request is probing; let a new probe through only if that one went silent
+                if now - self.probe_started < self.cooldown:
+                    raise CircuitOpenError(self._message(self.cooldown - (now - self.probe_started)))
+                self.probe_started = now
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.error_class = None
+
+    def record_failure(self, error_class: Optional[str]) -> None:
+        """
+        Record a failed request. error_class None means the site answered but the URL was bad,
+        which counts as a healthy response for a probe and leaves the failure streak alone otherwise.
+        """
+        with self._lock:
+            if error_class is None:
+                if self.state == 'half_open':
+                    self.state = 'closed'
+                    self.failures = 0
+                    self.error_class = None
+                return
+            if error_class == self.error_class:
+                self.failures += 1
+            else:
+                self.error_class = error_class
+                self.failures = 1
+            if self.state == 'half_open' or self.failures >= self.threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = {'state': self.state, 'failures': self.failures, 'error': self.error_class}
+            if self.state == 'open':
+                data['retry_in'] = max(0, int(self.cooldown - (time.monotonic() - self.opened_at)))
+            return data
+
+    def _message(self, remaining: float) -> str:
+        reason = ERROR_DESCRIPTIONS.get(self.error_class, 'the site keeps failing')
+        minutes = max(1, int(remaining // 60) + (remaining % 60 > 0))
+        return f"Downloads from {self.site} are paused because {reason}. Please try again in {minutes} min."
+
+
+# Circuit breakers: site -> CircuitBreaker
+breakers = {}
+_breakers_lock = threading.Lock()
+
+# Concurrency caps: (site, purpose) -> asyncio.Semaphore (acquired on the event loop)
+site_slots = {}
+
+
+def get_breaker(site: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if site not in breakers:
+            breakers[site] = CircuitBreaker(site)
+        return breakers[site]
+
+
+def get_site_slot(site: str, purpose: str = 'download') -> asyncio.Semaphore:
+    """
+    purpose: 'download', or 'analysis' for format analysis and playlist listing, which have their
+    own allowance so that long downloads do not hold up other users' links at the analysis step
+    """
+    key = (site, purpose)
+    if key not in site_slots:
+        site_slots[key] = asyncio.Semaphore(SITE_CONCURRENCY)
+    return site_slots[key]
+
+
+class SiteSlot:
+    """
+    One of a site's download slots, held by a download running in an executor thread only while
+    it contacts the site. The job takes it before the thread starts (extraction). As a yt-dlp
+    progress hook it is given back when a file has been transferred, so merging and
+    postprocessing run without it, and taken again from the thread if another part follows.
+    """
+
+    def __init__(self, semaphore: asyncio.Semaphore, loop: asyncio.AbstractEventLoop):
+        self.semaphore = semaphore
+        self.loop = loop
+        self.held = False
+
+    async def acquire(self) -> None:
+        await self.semaphore.acquire()
+        self.held = True
+
+    def hook(self, d: dict) -> None:
+        status = d.get('status')
+        if status == 'downloading':
+            if not self.held:
+                asyncio.run_coroutine_threadsafe(self.semaphore.acquire(), self.loop).result()
+                self.held = True
+        elif self.held:
+            self.held = False
+            self.loop.call_soon_threadsafe(self.semaphore.release)
+
+    def release(self) -> None:
+        """
+        Give the slot back for good. Call on the loop once the thread has finished.
+        """
+        if self.held:
+            self.held = False
+            self.semaphore.release()
+
+
+def breaker_status() -> dict:
+    """
+    State of every site seen so far, for the health endpoints.
+    """
+    with _breakers_lock:
+        items = list(breakers.items())
+    return {site: breaker.snapshot() for site, breaker in items}
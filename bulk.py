@@ -0,0 +1,176 @@
+import asyncio
+from config import BULK_MAX_ITEMS, BULK_WORKERS, BULK_MAX_ON_DISK, BULK_PROGRESS_INTERVAL
+from downloader import downloader, iter_playlist, run_in_site_slot
+from breakers import CircuitOpenError
+from utils import cleanup_file, get_file_size
+from tracing import NO_TRACE
+
+_DONE = object()
+
+
+class BulkJob:
+    """
+    Downloads a playlist or channel through a bounded pipeline:
+    a producer lists entries lazily (one page at a time), `workers` tasks download them and
+    one uploader sends each item as soon as it is ready. A download takes a disk slot before it
+    starts and the slot is freed once the file is sent and removed, so at most `max_on_disk`
+    files exist at any time however long the playlist is.
+    """
+
+    def __init__(self, url: str, format_type: str, quality: str, send, report=None, trace=None,
+                 limit: int = BULK_MAX_ITEMS, workers: int = BULK_WORKERS, max_on_disk: int = BULK_MAX_ON_DISK,
+                 interval: float = BULK_PROGRESS_INTERVAL):
+        """
+        send: async callable(filepath, info, index) that uploads one item
+        report: async callable(job) called with the job whenever its progress changes
+        """
+        self.url = url
+        self.format_type = format_type
+        self.quality = quality
+        self.send = send
+        self.report = report
+        self.trace = trace or NO_TRACE
+        self.limit = limit
+        self.workers = workers
+        self.max_on_disk = max_on_disk
+        self.interval = interval
+        self.title = None
+        self.found = 0
+        self.listed = False
+        self.downloading = 0
+        self.sent = 0
+        self.failed = 0
+        self.bytes_sent = 0
+        self.last_error = None
+        self.peak_on_disk = 0
+        self._on_disk = 0
+        self._running = asyncio.Event()
+        self._running.set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def pause(self) -> None:
+        """
+        Stop starting new downloads; items already downloading finish and are sent.
+        """
+        self._running.clear()
+
+    def resume(self) -> None:
+        self._running.set()
+
+    def snapshot(self) -> tuple:
+        return (self.found, self.listed, self.downloading, self.sent, self.failed, self.paused)
+
+    async def run(self) -> None:
+        """
+        Run the pipeline to the end. Cancelling the task stops every stage and removes
+        downloaded files that were not sent yet.
+        """
+        entries = asyncio.Queue(maxsize=self.workers)
+        ready = asyncio.Queue()
+        disk = asyncio.Semaphore(self.max_on_disk)
+        ticker = asyncio.create_task(self._ticker())
+        uploader = asyncio.create_task(self._upload(ready, disk))
+        producer = asyncio.create_task(self._produce(entries))
+        workers = [asyncio.create_task(self._download(entries, ready, disk)) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(producer, *workers)
+            await ready.put(_DONE)
+            await uploader
+        finally:
+            for task in (producer, *workers, uploader, ticker):
+                task.cancel()
+            # Files downloaded but never sent (cancelled or failed job)
+            while not ready.empty():
+                item = ready.get_nowait()
+                if item is not _DONE:
+                    cleanup_file(item[1])
+            self.trace.set(items=self.found, sent=self.sent, failed_items=self.failed, peak_on_disk=self.peak_on_disk)
+
+    async def _produce(self, entries: asyncio.Queue) -> None:
+        playlist = iter_playlist(self.url, self.limit)
+        try:
+            # Each step may fetch a page, so it takes a slot of the site like a download does
+            with self.trace.span('analysis') as span:
+                info = await run_in_site_slot(self.url, next, playlist)
+                span.set(extractor=info.get('extractor_key'))
+            self.title = info.get('title')
+            while True:
+                # Listing is paced by the workers through the bounded queue
+                item = await run_in_site_slot(self.url, next, playlist, None)
+                if item is None:
+                    break
+                self.found += 1
+                await entries.put(item)
+        finally:
+            self.listed = True
+            try:
+                playlist.close()
+            except ValueError:
+                # Still running in an executor thread after a cancel; it is dropped when that returns
+                pass
+        for _ in range(self.workers):
+            await entries.put(_DONE)
+
+    async def _download(self, entries: asyncio.Queue, ready: asyncio.Queue, disk: asyncio.Semaphore) -> None:
+        while True:
+            item = await entries.get()
+            if item is _DONE:
+                return
+            index, entry = item
+            await self._running.wait()
+            await disk.acquire()
+            self._on_disk += 1
+            self.peak_on_disk = max(self.peak_on_disk, self._on_disk)
+            self.downloading += 1
+            try:
+                filepath, info = await downloader.download_entry(self.url, entry, index, self.trace,
+                                                                 self.format_type, self.quality)
+            except CircuitOpenError:
+                # The site is down; the remaining items would fail the same way
+                raise
+            except ValueError as e:
+                self.failed += 1
+                self.last_error = str(e)
+                self._on_disk -= 1
+                disk.release()
+                continue
+            finally:
+                self.downloading -= 1
+            await ready.put((index, filepath, info))
+
+    async def _upload(self, ready: asyncio.Queue, disk: asyncio.Semaphore) -> None:
+        while True:
+            item = await ready.get()
+            if item is _DONE:
+                return
+            index, filepath, info = item
+            try:
+                size = get_file_size(filepath)
+                await self.send(filepath, info, index)
+                self.sent += 1
+                self.bytes_sent += size
+            except Exception as e:
+                self.failed += 1
+                self.last_error = str(e)
+            finally:
+                cleanup_file(filepath)
+                self._on_disk -= 1
+                disk.release()
+
+    async def _ticker(self) -> None:
+        last = None
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.snapshot() != last:
+                last = self.snapshot()
+                await self._report()
+
+    async def _report(self) -> None:
+        if self.report:
+            try:
+                await self.report(self)
+            except Exception:
+                pass
@@ -1,9 +1,13 @@
 import os
 import tempfile
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Process start time, for uptime reporting
+START_TIME = time.time()
+
 # Bot configuration
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 if not BOT_TOKEN:
@@ -19,4 +23,79 @@ MAX_FILE_SIZE = 2 * 1024 * 1024 * 1024  # 2 GB
 RATE_LIMIT = 5  # downloads per minute
 
 # Logging
-LOG_LEVEL = 'INFO'
\ No newline at end of file
+LOG_LEVEL = 'INFO'
+
+# Circuit breakers: after this many consecutive failures of the same kind (bot check,
+# throttling, outage) a site fails fast for BREAKER_COOLDOWN seconds, then one trial request probes it
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 300  # seconds
+
+# Retries for transient source errors (HTTP 429/5xx, timeouts), with jittered exponential backoff
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 2.0  # seconds
+RETRY_MAX_DELAY = 30.0  # seconds
+
+# Maximum concurrent downloads from the same site, counted while they extract or transfer
+# (not while merging or converting); format analysis and playlist listing have the same cap of their own
+SITE_CONCURRENCY = 2
+
+# Bandwidth budgets in bytes/sec, shared by all active jobs (0 = unlimited).
+# Admins can change them at runtime with /bandwidth.
+# Breakers, SITE_CONCURRENCY and these budgets are per process: with JOB_QUEUE, every worker
+# has its own, so give workers DOWNLOAD_BANDWIDTH / UPLOAD_BANDWIDTH divided by their number.
+DOWNLOAD_BANDWIDTH = int(os.getenv('DOWNLOAD_BANDWIDTH', 0))
+UPLOAD_BANDWIDTH = int(os.getenv('UPLOAD_BANDWIDTH', 0))
+
+# Fair-share weights per job type: small jobs get a bigger slice so they aren't stuck behind large videos
+JOB_WEIGHTS = {'image': 4, 'audio': 2, 'video': 1}
+
+# Telegram user ids allowed to use admin commands (comma-separated)
+ADMIN_IDS = {int(uid) for uid in os.getenv('ADMIN_IDS', '').split(',') if uid.strip()}
+
+# Event-loop monitoring: lag measurement and a log of the stack of anything blocking the loop
+# for longer than LOOP_LAG_THRESHOLD. Set LOOP_MONITOR=0 to disable.
+LOOP_MONITOR = os.getenv('LOOP_MONITOR', '1') != '0'
+LOOP_MONITOR_INTERVAL = 0.1  # seconds between heartbeats
+LOOP_LAG_THRESHOLD = 0.25  # seconds
+
+# Per-job tracing: timed spans appended as JSON lines to TRACE_FILE, rotated at TRACE_MAX_BYTES
+# with TRACE_BACKUPS old files kept. Set TRACE_FILE to an empty value to disable.
+# Queue workers write to their own file next to it (see tracing.worker_trace_file).
+TRACE_FILE = os.getenv('TRACE_FILE', os.path.join('traces', 'spans.jsonl'))
+TRACE_MAX_BYTES = 10 * 1024 * 1024  # 10 MB
+TRACE_BACKUPS = 3
+TRACE_FLUSH_INTERVAL = 2.0  # seconds
+
+# Media groups: multi-image messages and carousel/gallery posts are sent as albums of up to
+# MEDIA_GROUP_SIZE items (Telegram's limit is 10), downloading MEDIA_DOWNLOAD_CONCURRENCY items at once
+MEDIA_GROUP_SIZE = 10
+MEDIA_DOWNLOAD_CONCURRENCY = 4
+CAROUSEL_MAX_ITEMS = 20  # items taken from one multi-item post or board
+
+# Bulk mode for playlists and channels: entries are listed lazily and go through an
+# extract -> download -> upload pipeline with at most BULK_MAX_ON_DISK files on disk
+BULK_MAX_ITEMS = 500
+BULK_WORKERS = 2  # concurrent downloads
+BULK_MAX_ON_DISK = 3
+BULK_PROGRESS_INTERVAL = 3.0  # seconds between status message updates
+
+# Progress: download threads only update numbers; one renderer edits the changed status
+# messages every PROGRESS_INTERVAL seconds (Telegram allows about one edit per second per chat)
+PROGRESS_INTERVAL = 1.5  # seconds
+
+# Startup: hashes of what was last pushed to the Bot API (descriptions), so restarts skip unchanged updates
+BOT_STATE_FILE = os.getenv('BOT_STATE_FILE', os.path.join('state', 'bot_state.json'))
+
+# Custom Bot API server (e.g. a local telegram-bot-api instance); empty for api.telegram.org
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '')
+
+# Job queue: with JOB_QUEUE set to a SQLite file, the bot only analyzes links and enqueues
+# video/audio downloads there; `python worker.py` processes (any number, sharing the file) download,
+# send the result and publish progress. Empty runs downloads in the bot process.
+JOB_QUEUE = os.getenv('JOB_QUEUE', '')
+QUEUE_VISIBILITY_TIMEOUT = float(os.getenv('QUEUE_VISIBILITY_TIMEOUT', 60))  # seconds a claim lasts without a heartbeat
+QUEUE_MAX_ATTEMPTS = 3  # claims per job before a job whose workers keep dying is failed
+QUEUE_POLL_INTERVAL = 0.5  # seconds between queue polls by idle workers and progress watchers
+QUEUE_HEARTBEAT_INTERVAL = 1.0  # seconds between lease renewals, which also carry progress
+QUEUE_RETENTION = 24 * 3600  # seconds finished jobs are kept
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', 1))  # jobs per worker process
@@ -1,40 +1,287 @@
 import asyncio
+import itertools
 import os
 import shutil
-import yt_dlp
-import requests
-from config import TEMP_DIR, MAX_FILE_SIZE
+import time
+import uuid
+from urllib.parse import urlsplit
+from config import TEMP_DIR, MAX_FILE_SIZE, RETRY_ATTEMPTS, JOB_WEIGHTS, CAROUSEL_MAX_ITEMS, BULK_MAX_ITEMS, PROGRESS_INTERVAL
 from utils import get_file_size, cleanup_file
+from routing import url_dispatcher, media_kind
+from breakers import SourceError, classify_error, backoff_delay, get_breaker, get_site_slot, SiteSlot
+from bandwidth import download_pool, DownloadPacer
+from tracing import NO_TRACE
+
+# yt_dlp and requests are imported where they are used, keeping them off the startup path;
+# startup.warm_up loads them in the background once the bot is polling
 
 def extract_video_info(url: str) -> dict:
     """
     Extract video information without downloading.
+    Multi-item posts (carousels, galleries, boards) come back as a playlist of at most
+    CAROUSEL_MAX_ITEMS entries; entries that point to other pages are left unresolved.
+    A channel split into tabs comes back as one playlist (see _channel_uploads_url).
+    Raises CircuitOpenError without contacting the site if its breaker is open.
+    """
+    import yt_dlp
+    breaker = get_breaker(url_dispatcher.classify(url).site)
+    breaker.before_request()
+    try:
+        with yt_dlp.YoutubeDL({
+            'quiet': True,
+            'no_warnings': True,
+            'noplaylist': True,
+            'extract_flat': 'in_playlist',
+            'playlistend': CAROUSEL_MAX_ITEMS,
+        }) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+            uploads_url = _channel_uploads_url(info)
+            if uploads_url:
+                info = ydl.extract_info(uploads_url, download=False, process=False)
+            info = ydl.process_ie_result(info, download=False)
+    except yt_dlp.utils.DownloadError as e:
+        breaker.record_failure(classify_error(str(e)))
+        raise
+    breaker.record_success()
+    return info
+
+def _channel_uploads_url(info: dict):
+    """
+    A channel page with several tabs (Videos, Shorts, Live) comes back as a playlist of tab playlists.
+    Return a URL that lists the channel as one playlist: its uploads playlist on YouTube, else its
+    first tab. None if info is anything else.
+    """
+    entries = info.get('entries')
+    if info.get('_type') != 'playlist' or not isinstance(entries, list) or not entries:
+        return None
+    if not all(isinstance(entry, dict) and entry.get('_type') == 'playlist' for entry in entries):
+        return None
+    channel_id = info.get('channel_id') or ''
+    if (info.get('extractor_key') or '').startswith('Youtube') and channel_id.startswith('UC'):
+        return f'https://www.youtube.com/playlist?list=UU{channel_id[2:]}'
+    return entries[0].get('webpage_url')
+
+def is_link_entry(entry: dict) -> bool:
+    """
+    Check if a flat playlist entry only points to another page (playlist/channel item).
+    """
+    return entry.get('_type') in ('url', 'url_transparent')
+
+def is_nested_playlist(entry: dict) -> bool:
+    return entry.get('_type') in ('playlist', 'multi_video')
+
+def carousel_entries(info: dict) -> list:
     """
+    Return the items of a multi-item post, or [] if info describes a single video
+    or a playlist/channel (see is_bulk_playlist).
+    """
+    if info.get('_type') != 'playlist':
+        return []
+    entries = [entry for entry in info.get('entries') or [] if entry]
+    if any(is_link_entry(entry) or is_nested_playlist(entry) for entry in entries):
+        return []
+    return entries
+
+def is_bulk_playlist(info: dict) -> bool:
+    """
+    Check if info is a playlist, channel or board whose items are separate pages.
+    """
+    if info.get('_type') != 'playlist':
+        return False
+    return any(entry and (is_link_entry(entry) or is_nested_playlist(entry)) for entry in info.get('entries') or [])
+
+def iter_playlist(url: str, limit: int = BULK_MAX_ITEMS):
+    """
+    Enumerate a playlist or channel lazily with flat extraction.
+    Yields the playlist info (without entries) first, then (index, entry) pairs as pages are fetched.
+    Blocking: advance it from an executor thread. The YoutubeDL instance stays open
+    until the generator is exhausted or closed.
+    """
+    import yt_dlp
+    breaker = get_breaker(url_dispatcher.classify(url).site)
+    breaker.before_request()
     with yt_dlp.YoutubeDL({
         'quiet': True,
         'no_warnings': True,
-        'noplaylist': True,
-        'extract_flat': False
+        'extract_flat': True,
+        'lazy_playlist': True,
+        'playlistend': limit,
     }) as ydl:
-        return ydl.extract_info(url, download=False)
+        try:
+            info = ydl.extract_info(url, download=False, process=False)
+            # Channel pages may redirect to their uploads tab
+            for _ in range(3):
+                uploads_url = _channel_uploads_url(info)
+                if uploads_url:
+                    info = ydl.extract_info(uploads_url, download=False, process=False)
+                elif is_link_entry(info):
+                    info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+                else:
+                    break
+            if info.get('_type') != 'playlist':
+                raise ValueError("This link is not a playlist or channel.")
+            items = yt_dlp.utils.PlaylistEntries(ydl, info).get_requested_items()
+            yield {key: value for key, value in info.items() if key != 'entries'}
+            for index, entry in itertools.islice(items, limit):
+                if entry:
+                    yield index, entry
+        except yt_dlp.utils.DownloadError as e:
+            breaker.record_failure(classify_error(str(e)))
+            raise SourceError(f"Could not list playlist: {str(e)}", classify_error(str(e)))
+    breaker.record_success()
+
+async def run_in_site_slot(url: str, func, *args):
+    """
+    Run a blocking call that contacts url's site (extract_video_info, a step of iter_playlist)
+    in the executor under the site's analysis concurrency cap.
+    """
+    slot = get_site_slot(url_dispatcher.classify(url).site, 'analysis')
+    await slot.acquire()
+    future = asyncio.get_running_loop().run_in_executor(None, func, *args)
+    # The thread cannot be stopped, so a cancelled call keeps the slot until it returns
+    future.add_done_callback(lambda _: slot.release())
+    return await asyncio.shield(future)
+
+def downloaded_kind(filepath: str, info: dict) -> str:
+    """
+    Return 'image', 'audio' or 'video' for a downloaded item.
+    """
+    kind = media_kind(filepath)
+    if kind:
+        return kind
+    if info.get('vcodec') == 'none' and info.get('acodec') not in (None, 'none'):
+        return 'audio'
+    return 'video'
+
+def _reported_filepath(info: dict):
+    """
+    Final path of the file yt-dlp produced for info, or None if it did not report an existing one.
+    """
+    downloads = info.get('requested_downloads') or [{}]
+    filepath = downloads[0].get('filepath')
+    return filepath if filepath and os.path.exists(filepath) else None
+
+def _discard_download(future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        cleanup_file(future.result()[0])
+
+# Fields of a url_transparent entry that do not override the resolved result (as in yt-dlp)
+TRANSPARENT_EXEMPT = ('_type', 'url', 'ie_key', 'id', 'extractor', 'extractor_key')
+
+def _resolve_entry(ydl, entry: dict) -> dict:
+    """
+    Resolve a link entry to what it points to, without downloading. An item must be a single
+    video: a playlist (e.g. an entry of a channel's Playlists tab) would otherwise be downloaded
+    whole as one item, past the disk and size limits.
+    """
+    result = dict(entry)
+    for _ in range(3):
+        if not is_link_entry(result):
+            break
+        resolved = ydl.extract_info(result['url'], download=False, process=False, ie_key=result.get('ie_key'))
+        if result['_type'] == 'url_transparent':
+            # The entry's own fields override the resolved ones
+            resolved = {**resolved, **{key: value for key, value in result.items()
+                                       if value is not None and key not in TRANSPARENT_EXEMPT}}
+        result = resolved
+    if is_nested_playlist(result):
+        raise ValueError("This item is a playlist, not a single video. Send its link to download it.")
+    return result
 
 class VideoDownloader:
     def __init__(self):
         self.temp_dir = TEMP_DIR
 
-    async def download_video(self, url: str, format_type: str = 'video', quality: str = '720p', progress_callback=None) -> tuple[str, dict]:
+    async def download_video(self, url: str, format_type: str = 'video', quality: str = '720p', progress=None, trace=None) -> tuple[str, dict]:
         """
         Download video from URL asynchronously.
         Returns (filepath, info_dict) or raises exception.
-        progress_callback: function to call with progress message
+        progress: JobProgress the download thread keeps up to date (see progress.py)
+        trace: job Trace that receives the extract/download/postprocess spans
+        Transient source errors are retried with jittered backoff; the site's circuit breaker
+        and concurrency cap are applied before an executor thread is taken.
+        """
+        return await self._run_download(
+            url, JOB_WEIGHTS.get(format_type, 1), progress, trace,
+            self._download_sync, url, format_type, quality, progress)
+
+    async def download_entry(self, url: str, entry: dict, index: int, trace=None,
+                             format_type: str = 'video', quality: str = 'best') -> tuple[str, dict]:
         """
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._download_sync, url, format_type, quality, progress_callback)
+        Download one item of a multi-item post or playlist (see carousel_entries, iter_playlist) found at url.
+        Returns (filepath, info_dict) or raises exception.
+        """
+        # Judge by the path: CDN image links usually carry a query string (e.g. '.jpg?stp=...')
+        if media_kind(urlsplit(entry.get('url') or '').path) == 'image':
+            weight = JOB_WEIGHTS['image']
+        else:
+            weight = JOB_WEIGHTS.get(format_type, 1)
+        return await self._run_download(url, weight, None, trace, self._download_entry_sync, entry, index, format_type, quality)
 
-    def _download_sync(self, url: str, format_type: str, quality: str, progress_callback=None) -> tuple[str, dict]:
+    async def _run_download(self, url: str, weight: float, progress, trace, func, *args) -> tuple[str, dict]:
+        """
+        Run a blocking download function in the executor under the site's circuit breaker and
+        concurrency cap (a SiteSlot, held while the site is contacted), paced by a DownloadPacer of
+        the given weight, retrying transient source errors.
+        func is called with *args followed by the yt-dlp progress hooks of the two and the trace.
+        """
+        trace = trace or NO_TRACE
+        site = url_dispatcher.classify(url).site
+        breaker = get_breaker(site)
+        loop = asyncio.get_running_loop()
+        # Fail fast when the site is known to be down
+        breaker.before_request()
+        attempt = 0
+        while True:
+            trace.set(retries=attempt)
+            attempt_start = time.time()
+            try:
+                slot = SiteSlot(get_site_slot(site), loop)
+                await slot.acquire()
+                pacer = DownloadPacer(download_pool, weight)
+                future = loop.run_in_executor(None, func, *args, (slot.hook, pacer.hook), trace)
+
+                def finished(_):
+                    # Also covers a thread that is still running after a cancel
+                    slot.release()
+                    pacer.release()
+
+                future.add_done_callback(finished)
+                try:
+                    result = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # The thread cannot be stopped; remove its file once it is done
+                    future.add_done_callback(_discard_download)
+                    raise
+            except ValueError as e:
+                # A whole failed attempt (extract + transfer + postprocess), kept apart from the transfer-only 'download' span
+                trace.record('attempt', attempt_start, time.time(), status='error', error=str(e), attempt=attempt + 1)
+                if not isinstance(e, SourceError):
+                    breaker.record_failure(None)
+                    raise
+                attempt += 1
+                # A half-open trial request gets no retries: its outcome decides the breaker state
+                if e.transient and attempt < RETRY_ATTEMPTS and breaker.state == 'closed':
+                    delay = backoff_delay(attempt - 1)
+                    if progress:
+                        progress.info(f"Source is busy, retrying in {delay:.0f}s (attempt {attempt + 1}/{RETRY_ATTEMPTS})")
+                    await asyncio.sleep(delay)
+                    continue
+                breaker.record_failure(e.error_class)
+                raise
+            breaker.record_success()
+            return result
+
+    def _download_sync(self, url: str, format_type: str, quality: str, progress=None, transfer_hooks=(), trace=None) -> tuple[str, dict]:
         """
         Synchronous download function.
+        progress: JobProgress updated from yt-dlp's progress hook.
+        transfer_hooks: progress hooks of the job's SiteSlot and DownloadPacer (see _run_download).
+        trace: job Trace; stage times are taken from yt-dlp's progress hooks.
         """
+        import yt_dlp
+        trace = trace or NO_TRACE
+        timings = {'start': time.time()}
         # Determine format and postprocessing based on type
         if format_type == 'audio':
             format_str = 'bestaudio/best'
@@ -45,46 +292,26 @@ class VideoDownloader:
         # If ffmpeg is not available, fallback to a single-file download to avoid merge errors
         has_ffmpeg = shutil.which('ffmpeg') is not None
         if format_type != 'audio' and not has_ffmpeg:
-            # Notify via progress callback if provided (structured message)
-            if progress_callback:
-                try:
-                    progress_callback({
-                        'status': 'info',
-                        'message': 'ffmpeg not found — falling back to single-file download. Install ffmpeg to enable merged best video+audio.'
-                    })
-                except Exception:
-                    pass
+            if progress:
+                progress.info('ffmpeg not found — falling back to single-file download. Install ffmpeg to enable merged best video+audio.')
             format_str = 'best'
 
         os.makedirs(self.temp_dir, exist_ok=True)
-        output_template = os.path.join(self.temp_dir, '%(title)s.%(ext)s')
+        # Unique per job: two jobs for the same video (or same generic title) must not share a file
+        output_template = os.path.join(self.temp_dir, f'%(id)s_{uuid.uuid4().hex[:8]}.%(ext)s')
 
-        def progress_hook(d):
-            try:
-                status = d.get('status')
-                if status == 'downloading' and progress_callback:
-                    percent_str = d.get('_percent_str') or d.get('percent') or '0%'
-                    # normalize percent to float
-                    try:
-                        percent_val = float(str(percent_str).strip().replace('%', ''))
-                    except Exception:
-                        percent_val = 0.0
-
-                    speed = d.get('_speed_str', d.get('speed')) or 'N/A'
-                    eta = d.get('_eta_str', d.get('eta')) or 'N/A'
-
-                    progress_callback({
-                        'status': 'downloading',
-                        'percent': percent_val,
-                        'percent_str': f"{percent_val:.1f}%",
-                        'speed': speed,
-                        'eta': eta,
-                    })
-                elif status == 'finished' and progress_callback:
-                    # finished downloading a part (video/audio), merging/postprocessing may follow
-                    progress_callback({'status': 'finished'})
-            except Exception:
-                pass
+        def timing_hook(d):
+            status = d.get('status')
+            if status == 'downloading' and 'download_start' not in timings:
+                timings['download_start'] = time.time()
+            elif status == 'finished':
+                timings['download_end'] = time.time()
+
+        hooks = list(transfer_hooks)
+        if progress:
+            hooks.append(progress.hook)
+        if trace.enabled:
+            hooks.append(timing_hook)
 
         ydl_opts = {
             'format': format_str,
@@ -93,21 +320,14 @@ class VideoDownloader:
             'quiet': True,
             'no_warnings': True,
             'extract_flat': False,
-            'progress_hooks': [progress_hook] if progress_callback else [],
+            'progress_hooks': hooks,
+            # Nothing reads yt-dlp's own progress line; skip printing it and only format it once per interval
+            'noprogress': True,
+            'progress_delta': PROGRESS_INTERVAL,
             'prefer_ffmpeg': True,
         }
 
-        # Add merge output format for video to ensure final file is playable (mp4)
-        if format_type == 'video' and has_ffmpeg:
-            ydl_opts['merge_output_format'] = 'mp4'
-
-        # Add postprocessor to convert audio to mp3 when requested
-        if format_type == 'audio' and quality == 'mp3':
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }]
+        ydl_opts.update(self._postprocess_options(format_type, quality, has_ffmpeg))
 
         try:
             # Snapshot files present before download so we can identify newly created files
@@ -119,17 +339,19 @@ class VideoDownloader:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=True)
 
-                # Determine the produced file by looking for new files in temp_dir
-                filepath = None
-                try:
-                    after_files = set(os.listdir(self.temp_dir))
-                    new_files = [f for f in after_files - before_files if not f.endswith('.part')]
-                    new_paths = [os.path.join(self.temp_dir, f) for f in new_files]
-                    # If multiple new files (video+audio parts), pick the largest one
-                    if new_paths:
-                        filepath = max(new_paths, key=os.path.getsize)
-                except Exception:
-                    filepath = None
+                # yt-dlp reports the final file (after merging and postprocessing). Other jobs download
+                # into the same temp_dir at the same time, so the directory diff is only a fallback.
+                filepath = _reported_filepath(info)
+                if not filepath:
+                    try:
+                        after_files = set(os.listdir(self.temp_dir))
+                        new_files = [f for f in after_files - before_files if not f.endswith('.part')]
+                        new_paths = [os.path.join(self.temp_dir, f) for f in new_files]
+                        # If multiple new files (video+audio parts), pick the largest one
+                        if new_paths:
+                            filepath = max(new_paths, key=os.path.getsize)
+                    except Exception:
+                        filepath = None
 
                 # Fallback: try yt-dlp's prepare_filename and previous matching logic
                 if not filepath:
@@ -152,11 +374,13 @@ class VideoDownloader:
                     cleanup_file(filepath)
                     raise ValueError(f"File size ({size} bytes) exceeds limit ({MAX_FILE_SIZE // (1024*1024*1024)}GB)")
 
+                self._record_stages(trace, timings, info, size, fallback_format=False)
                 return filepath, info
         except yt_dlp.utils.DownloadError as e:
             error_msg = str(e)
+            error_class = classify_error(error_msg)
             if "Sign in to confirm" in error_msg or "cookies" in error_msg.lower():
-                raise ValueError("This video requires authentication (age-restricted or bot-protected). Unable to download.")
+                raise SourceError("This video requires authentication (age-restricted or bot-protected). Unable to download.", error_class)
             elif "Requested format is not available" in error_msg or "Unknown format code" in error_msg:
                 # Retry with best available format
                 ydl_opts['format'] = 'best' if format_type == 'video' else 'bestaudio'
@@ -165,32 +389,131 @@ class VideoDownloader:
                              info = ydl.extract_info(url, download=True)
                              filename = ydl.prepare_filename(info)
                              base = os.path.splitext(filename)[0]
-                             filepath = filename
-                             try:
-                                 candidates = [os.path.join(self.temp_dir, f) for f in os.listdir(self.temp_dir) if f.startswith(os.path.basename(base))]
-                                 candidates = [c for c in candidates if not c.endswith('.part')]
-                                 if candidates:
-                                     filepath = max(candidates, key=os.path.getsize)
-                             except Exception:
-                                 pass
+                             filepath = _reported_filepath(info)
+                             if not filepath:
+                                 filepath = filename
+                                 try:
+                                     candidates = [os.path.join(self.temp_dir, f) for f in os.listdir(self.temp_dir) if f.startswith(os.path.basename(base))]
+                                     candidates = [c for c in candidates if not c.endswith('.part')]
+                                     if candidates:
+                                         filepath = max(candidates, key=os.path.getsize)
+                                 except Exception:
+                                     pass
 
                              size = get_file_size(filepath)
                              if size > MAX_FILE_SIZE:
                                  cleanup_file(filepath)
                                  raise ValueError(f"File size ({size} bytes) exceeds limit ({MAX_FILE_SIZE // (1024*1024*1024)}GB)")
 
+                             self._record_stages(trace, timings, info, size, fallback_format=True)
                              return filepath, info
                 except Exception as retry_e:
-                    raise ValueError(f"Download failed even with fallback format: {str(retry_e)}")
+                    raise SourceError(f"Download failed even with fallback format: {str(retry_e)}", classify_error(str(retry_e)))
             else:
-                raise ValueError(f"Download failed: {error_msg}")
+                raise SourceError(f"Download failed: {error_msg}", error_class)
+        except Exception as e:
+            raise ValueError(f"Unexpected error: {str(e)}")
+
+    @staticmethod
+    def _postprocess_options(format_type: str, quality: str, has_ffmpeg: bool) -> dict:
+        """
+        yt-dlp options for the output container and audio conversion of a download type.
+        """
+        opts = {}
+        # Add merge output format for video to ensure final file is playable (mp4)
+        if format_type == 'video' and has_ffmpeg:
+            opts['merge_output_format'] = 'mp4'
+
+        # Add postprocessor to convert audio to mp3 when requested
+        if format_type == 'audio' and quality == 'mp3':
+            opts['postprocessors'] = [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }]
+        return opts
+
+    def _download_entry_sync(self, entry: dict, index: int, format_type: str = 'video', quality: str = 'best',
+                             transfer_hooks=(), trace=None) -> tuple[str, dict]:
+        """
+        Synchronous download of one playlist entry. Entries that are only a link are resolved here.
+        Every item gets its own file name, so items of one post can download concurrently.
+        """
+        import yt_dlp
+        trace = trace or NO_TRACE
+        timings = {'start': time.time()}
+
+        def timing_hook(d):
+            status = d.get('status')
+            if status == 'downloading' and 'download_start' not in timings:
+                timings['download_start'] = time.time()
+            elif status == 'finished':
+                timings['download_end'] = time.time()
+
+        hooks = list(transfer_hooks)
+        if trace.enabled:
+            hooks.append(timing_hook)
+
+        os.makedirs(self.temp_dir, exist_ok=True)
+        ydl_opts = {
+            'format': 'bestaudio/best' if format_type == 'audio' else 'best',
+            'outtmpl': os.path.join(self.temp_dir, f'%(id)s_{index}_{uuid.uuid4().hex[:8]}.%(ext)s'),
+            'noplaylist': True,
+            'quiet': True,
+            'no_warnings': True,
+            'noprogress': True,
+            'progress_delta': PROGRESS_INTERVAL,
+            'progress_hooks': hooks,
+        }
+        ydl_opts.update(self._postprocess_options(format_type, quality, shutil.which('ffmpeg') is not None))
+
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.process_ie_result(_resolve_entry(ydl, entry), download=True)
+                downloads = info.get('requested_downloads') or [{}]
+                filepath = downloads[0].get('filepath') or ydl.prepare_filename(info)
+        except yt_dlp.utils.DownloadError as e:
+            raise SourceError(f"Download failed: {str(e)}", classify_error(str(e)))
+        except ValueError:
+            raise
         except Exception as e:
             raise ValueError(f"Unexpected error: {str(e)}")
 
+        if not os.path.exists(filepath):
+            raise ValueError('Could not determine downloaded file path')
+        size = get_file_size(filepath)
+        if size > MAX_FILE_SIZE:
+            cleanup_file(filepath)
+            raise ValueError(f"File size ({size} bytes) exceeds limit ({MAX_FILE_SIZE // (1024*1024*1024)}GB)")
+
+        self._record_stages(trace, timings, info, size, fallback_format=False)
+        return filepath, info
+
+    @staticmethod
+    def _record_stages(trace, timings: dict, info: dict, size: int, fallback_format: bool) -> None:
+        """
+        Split a finished yt-dlp run into extract, download and postprocess spans.
+        """
+        end = time.time()
+        download_end = timings.get('download_end', end)
+        # Files that were already on disk only report 'finished'
+        download_start = timings.get('download_start', download_end)
+        attrs = {
+            'extractor': info.get('extractor_key'),
+            'format': info.get('format_id'),
+            'bytes': size,
+            'fallback_format': fallback_format,
+        }
+        trace.set(**attrs)
+        trace.record('extract', timings['start'], download_start, extractor=attrs['extractor'])
+        trace.record('download', download_start, download_end, **attrs)
+        trace.record('postprocess', download_end, end, format=attrs['format'])
+
 def get_image_info(url: str) -> dict:
     """
     Get basic info about an image URL.
     """
+    import requests
     try:
         response = requests.head(url, timeout=5)
         response.raise_for_status()
@@ -207,12 +530,15 @@ def download_image(url: str) -> str:
     Download image from URL.
     Returns filepath or raises exception.
     """
+    import requests
+    filepath = None
     try:
-        response = requests.get(url, timeout=30)
+        response = requests.get(url, timeout=30, stream=True)
         response.raise_for_status()
         
         content_type = response.headers.get('content-type', '')
         if not content_type.startswith('image/'):
+            response.close()
             raise ValueError("URL does not point to an image")
         
         # Get filename
@@ -223,10 +549,16 @@ def download_image(url: str) -> str:
             ext = content_type.split('/')[-1] if '/' in content_type else 'jpg'
             filename = f'image.{ext}'
         
-        filepath = os.path.join(TEMP_DIR, filename)
+        # Prefix keeps concurrent downloads of same-named images apart
+        filepath = os.path.join(TEMP_DIR, f"{uuid.uuid4().hex[:8]}_{filename}")
         
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
+        # Stream to disk, paced by this image's share of the download budget
+        with download_pool.acquire(JOB_WEIGHTS['image']) as lease, response, open(filepath, 'wb') as f:
+            for chunk in response.iter_content(64 * 1024):
+                wait = lease.delay(len(chunk))
+                if wait > 0:
+                    time.sleep(wait)
+                f.write(chunk)
         
         # Check size
         size = get_file_size(filepath)
@@ -236,6 +568,9 @@ def download_image(url: str) -> str:
         
         return filepath
     except requests.RequestException as e:
+        # The body is streamed to disk, so a transfer that breaks off leaves a partial file
+        if filepath:
+            cleanup_file(filepath)
         raise ValueError(f"Failed to download image: {str(e)}")
 
 # Global instance
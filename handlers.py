@@ -1,18 +1,29 @@
 import asyncio
 import time
 import os
+from urllib.parse import urlsplit
 from aiogram import Router, types, F
 from aiogram.filters import Command
-from downloader import downloader, extract_video_info, download_image, get_image_info
-from utils import is_valid_url, is_image_url, cleanup_file
-from config import RATE_LIMIT
+from aiogram.exceptions import TelegramRetryAfter
+from downloader import downloader, extract_video_info, run_in_site_slot, download_image, get_image_info, carousel_entries, downloaded_kind, is_bulk_playlist
+from utils import is_valid_url, cleanup_file, get_file_size, upload_filename
+from config import RATE_LIMIT, ADMIN_IDS, START_TIME, CAROUSEL_MAX_ITEMS, BULK_MAX_ITEMS, QUEUE_POLL_INTERVAL
+from routing import url_dispatcher
+from breakers import breaker_status
+from bandwidth import ThrottledInputFile, download_pool, upload_pool, parse_rate, format_rate
+from monitoring import loop_monitor
+from tracing import Trace
+from media_groups import MediaGroupSender, download_and_send
+from bulk import BulkJob
+from progress import progress_renderer
+from jobqueue import job_queue, QUEUED, RUNNING, FINISHED, FAILED, CANCELLED
 
 router = Router()
 
 # Rate limiting: user_id -> list of timestamps
 user_rates = {}
 
-# Active downloads: user_id -> {'url': str, 'task': Task}
+# Active downloads: user_id -> {'url': str, 'task': Task, 'trace': Trace, 'prompted_at': float, 'bulk': BulkJob}
 active_downloads = {}
 
 # User history: user_id -> list of {'url': str, 'type': str, 'timestamp': float}
@@ -36,63 +47,80 @@ def check_rate_limit(user_id: int) -> bool:
     return True
 
 
-def make_progress_cb(message: types.Message, loop, throttle: float = 1.5):
+async def send_traced(trace, send, chat_id, media: types.FSInputFile, **kwargs):
     """
-    Return a progress callback that accepts a dict or string and edits `message` with
-    an inline progress bar. Edits are throttled to `throttle` seconds.
+    Call a Bot send method inside an 'upload' span that records the method and file size.
     """
-    last = {'time': 0.0, 'percent': -1.0}
+    with trace.span('upload', method=send.__name__, bytes=get_file_size(media.path)):
+        return await send(chat_id, media, **kwargs)
 
-    async def _edit(text: str):
-        try:
-            await message.edit_text(text)
-        except Exception:
-            pass
-
-    def cb(data):
-        now = time.time()
-        # Backwards compatibility: allow string messages
-        if isinstance(data, str):
-            text = data
-            percent = None
-        else:
-            status = data.get('status')
-            if status == 'downloading':
-                percent = float(data.get('percent') or 0.0)
-                p = max(0.0, min(100.0, percent))
-                bar_len = 25
-                filled = int((p / 100.0) * bar_len)
-                bar = '▰' * filled + '▱' * (bar_len - filled)
-                speed = data.get('speed', 'N/A')
-                eta = data.get('eta', 'N/A')
-                text = f"📥 Downloading: [{bar}] {p:5.1f}% | ⚡ Speed: {speed} | ⏱️ ETA: {eta}"
-            elif status == 'finished':
-                percent = 100.0
-                text = "✅ Download finished, processing..."
-            elif status == 'info':
-                percent = None
-                text = f"ℹ️ {data.get('message', '')}"
-            else:
-                percent = None
-                text = f"🔄 {str(data)}"
-
-        # Throttle edits: if within throttle window and percent change < 1%, skip
-        if now - last['time'] < throttle:
-            try:
-                if percent is None:
-                    return
-                if abs(percent - last['percent']) < 1.0:
-                    return
-            except Exception:
-                return
-
-        last['time'] = now
-        if percent is not None:
-            last['percent'] = percent
-
-        asyncio.run_coroutine_threadsafe(_edit(text), loop)
+async def watch_queued_job(job_id: int, status_msg: types.Message, trace):
+    """
+    Mirror a queued job's position and the progress its worker publishes onto status_msg until
+    the job finishes. Returns (status, error). Cancelling the watcher cancels the job.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        with progress_renderer.track(status_msg, trace) as progress:
+            while True:
+                job = await loop.run_in_executor(None, job_queue.get, job_id)
+                if job is None:
+                    return FAILED, "The job was lost from the queue"
+                if job['status'] in FINISHED:
+                    return job['status'], job['error']
+                if job['status'] == QUEUED:
+                    progress.queued(job['ahead'])
+                elif job['progress']:
+                    progress.restore(job['progress'])
+                await asyncio.sleep(QUEUE_POLL_INTERVAL)
+    except asyncio.CancelledError:
+        await loop.run_in_executor(None, job_queue.cancel, job_id)
+        raise
 
-    return cb
+async def run_queued_download(user_id: int, chat_id: int, status_msg: types.Message, url: str, format_type: str,
+                              quality: str, trace, default_title: str = None, with_duration: bool = False):
+    """
+    Hand a video/audio download to the worker processes and wait for it. The worker sends the
+    file to chat_id itself. Raises ValueError if the job failed; cancelling the user's active
+    download cancels the job.
+    """
+    loop = asyncio.get_running_loop()
+    payload = {'url': url, 'format_type': format_type, 'quality': quality, 'trace_id': trace.trace_id,
+               'default_title': default_title, 'with_duration': with_duration}
+    with trace.span('enqueue'):
+        job_id = await loop.run_in_executor(None, job_queue.enqueue, user_id, chat_id, payload)
+    trace.set(job_id=job_id)
+    task = asyncio.create_task(watch_queued_job(job_id, status_msg, trace))
+    active_downloads.setdefault(user_id, {'url': url, 'trace': trace})['task'] = task
+    status, error = await task
+    if status == CANCELLED:
+        raise ValueError("The download was cancelled")
+    if status == FAILED:
+        raise ValueError(error or "The download failed")
+
+def bulk_status_text(job: BulkJob) -> str:
+    """
+    One-message summary of a bulk download.
+    """
+    total = f"{job.found}" if job.listed else f"{job.found}+"
+    text = (f"📦 {job.title or 'Playlist'}\n"
+            f"✅ Sent: {job.sent}/{total} | 📥 Downloading: {job.downloading} | ❌ Failed: {job.failed}")
+    if job.paused:
+        text += "\n⏸️ Paused"
+    if job.last_error:
+        text += f"\nLast error: {job.last_error[:200]}"
+    return text
+
+def bulk_keyboard(paused: bool) -> types.InlineKeyboardMarkup:
+    toggle = types.InlineKeyboardButton(text="Resume", callback_data="bulk_resume") if paused else \
+        types.InlineKeyboardButton(text="Pause", callback_data="bulk_pause")
+    return types.InlineKeyboardMarkup(inline_keyboard=[[toggle, types.InlineKeyboardButton(text="Cancel", callback_data="cancel")]])
+
+def is_pinterest(route) -> bool:
+    """
+    Check if a routed URL belongs to Pinterest, including pin.it short links.
+    """
+    return (route.extractor or '').startswith('Pinterest') or urlsplit(route.url).hostname == 'pin.it'
 
 @router.message(Command("start"))
 async def start_command(message: types.Message):
@@ -135,27 +163,176 @@ async def health_command(message: types.Message):
     """
     Handle /health command to check bot status.
     """
-    from main import start_time
-    elapsed = time.time() - start_time
+    elapsed = time.time() - START_TIME
     hours = int(elapsed // 3600)
     minutes = int((elapsed % 3600) // 60)
     uptime = f"{hours}h {minutes}m"
-    await message.reply(f"✅ Bot is healthy!\n⏱️ Uptime: {uptime}\n🔧 Active downloads: {len(active_downloads)}")
+    loop_stats = loop_monitor.metrics()
+    text = (f"✅ Bot is healthy!\n⏱️ Uptime: {uptime}\n🔧 Active downloads: {len(active_downloads)}"
+            f"\n🐢 Loop lag: {loop_stats['loop_lag_seconds'] * 1000:.1f} ms (max {loop_stats['loop_lag_max_seconds'] * 1000:.1f} ms)")
+    if job_queue:
+        queue_stats = await asyncio.get_running_loop().run_in_executor(None, job_queue.stats)
+        text += f"\n📬 Job queue: {queue_stats[QUEUED]} queued, {queue_stats[RUNNING]} running"
+    tripped = {site: state for site, state in breaker_status().items() if state['state'] != 'closed'}
+    for site, state in tripped.items():
+        retry = f", retry in {state['retry_in']}s" if 'retry_in' in state else ''
+        text += f"\n🚧 {site}: {state['state']} ({state['error']}{retry})"
+    if job_queue and tripped:
+        text += "\n(circuit breakers of this process; queue workers keep their own)"
+    await message.reply(text)
+
+@router.message(Command("bandwidth"))
+async def bandwidth_command(message: types.Message):
+    """
+    Handle /bandwidth [download] [upload] to show or change the shared bandwidth budgets.
+    Rates are bytes/sec with optional K/M/G suffix; 0 means unlimited. Admins only.
+    """
+    if message.from_user.id not in ADMIN_IDS:
+        await message.reply("This command is only available to admins.")
+        return
+
+    args = message.text.split()[1:]
+    try:
+        rates = [parse_rate(arg) for arg in args[:2]]
+    except ValueError as e:
+        await message.reply(f"Error: {str(e)}\nUsage: /bandwidth [download] [upload], e.g. /bandwidth 5M 1M")
+        return
+    if len(rates) > 0:
+        download_pool.set_limit(rates[0])
+    if len(rates) > 1:
+        upload_pool.set_limit(rates[1])
+
+    lines = []
+    for pool in (download_pool, upload_pool):
+        state = pool.snapshot()
+        lines.append(f"{pool.name.capitalize()}: {format_rate(state['limit'])} shared by {state['jobs']} active job(s)")
+    if job_queue:
+        lines.append("These budgets cover downloads in the bot process only; queue workers use their own DOWNLOAD_BANDWIDTH/UPLOAD_BANDWIDTH.")
+    await message.reply("\n".join(lines))
+
+async def send_media_batch(message: types.Message, status_msg: types.Message, url: str, trace, downloads: list, noun: str):
+    """
+    Download several items concurrently and send them as albums, editing `status_msg`
+    once per album rather than once per item.
+    downloads: async callables returning (filepath, kind, caption, filename)
+    """
+    user_id = message.from_user.id
+    total = len(downloads)
+    trace.set(items=total)
 
-async def process_single_url(message: types.Message, url: str):
+    async def on_sent(sent: int):
+        try:
+            await status_msg.edit_text(f"Sent {sent}/{total} {noun}...", reply_markup=status_msg.reply_markup)
+        except Exception:
+            pass
+
+    sender = MediaGroupSender(message.bot, message.chat.id, trace, on_sent=on_sent)
+    status, error = 'ok', None
+    try:
+        task = asyncio.create_task(download_and_send(sender, downloads))
+        active_downloads[user_id] = {'url': url, 'task': task, 'trace': trace}
+        errors = await task
+        trace.set(failed_items=len(errors))
+        if errors and not sender.sent:
+            status, error = 'error', errors[0]
+            await status_msg.edit_text(f"Error: {errors[0]}")
+        elif errors:
+            await status_msg.edit_text(f"Sent {sender.sent}/{total} {noun}. {len(errors)} could not be downloaded: {errors[0]}")
+        else:
+            await status_msg.edit_text(f"Download complete! Sent {total} {noun}.")
+    except asyncio.CancelledError:
+        status = 'cancelled'
+        await status_msg.edit_text(f"Download cancelled. Sent {sender.sent}/{total} {noun}.")
+    except ValueError as e:
+        status, error = 'error', str(e)
+        await status_msg.edit_text(f"Error: {str(e)}")
+    except Exception as e:
+        status, error = 'error', str(e)
+        await status_msg.edit_text("An unexpected error occurred.")
+    finally:
+        if user_id in active_downloads:
+            del active_downloads[user_id]
+        trace.finish(status, error)
+    return status == 'ok'
+
+async def process_image_batch(message: types.Message, urls: list):
+    """
+    Download several direct image links from one message and send them as albums.
+    """
+    user_id = message.from_user.id
+    if user_id in active_downloads:
+        await message.reply("You already have a download in progress. Please wait for it to complete.")
+        return
+
+    trace = Trace(user_id=user_id, url=urls[0], kind='image_batch')
+    loop = asyncio.get_running_loop()
+
+    def fetch(url):
+        async def download():
+            filepath = await loop.run_in_executor(None, download_image, url)
+            return filepath, 'image', None, None
+        return download
+
+    cancel_keyboard = types.InlineKeyboardMarkup(inline_keyboard=[[types.InlineKeyboardButton(text="Cancel", callback_data="cancel")]])
+    status_msg = await message.reply(f"Downloading {len(urls)} images...", reply_markup=cancel_keyboard)
+    await send_media_batch(message, status_msg, urls[0], trace, [fetch(url) for url in urls], 'images')
+
+async def process_carousel(message: types.Message, status_msg: types.Message, url: str, info: dict, entries: list, trace):
+    """
+    Download every item of a multi-item post (carousel, gallery, board) and send them as albums.
+    """
+    user_id = message.from_user.id
+    title = info.get('title') or 'Album'
+    trace.set(kind='carousel')
+
+    def fetch(index, entry):
+        async def download():
+            filepath, item_info = await downloader.download_entry(url, entry, index, trace)
+            # The post title goes on the first item, where Telegram shows it as the album caption
+            return (filepath, downloaded_kind(filepath, item_info), title if index == 0 else None,
+                    upload_filename(filepath, item_info.get('title')))
+        return download
+
+    cancel_keyboard = types.InlineKeyboardMarkup(inline_keyboard=[[types.InlineKeyboardButton(text="Cancel", callback_data="cancel")]])
+    await status_msg.edit_text(f"Downloading {len(entries)} items...", reply_markup=cancel_keyboard)
+    downloads = [fetch(index, entry) for index, entry in enumerate(entries)]
+    if await send_media_batch(message, status_msg, url, trace, downloads, 'items'):
+        # Add to history
+        if user_id not in user_history:
+            user_history[user_id] = []
+        user_history[user_id].append({
+            'url': url,
+            'type': 'album',
+            'timestamp': time.time()
+        })
+        user_history[user_id] = user_history[user_id][-10:]
+
+async def process_single_url(message: types.Message, url: str, route=None):
     """
     Process a single URL for download.
+    route: the URL's Route if the caller already resolved it
     """
     user_id = message.from_user.id
     
     if user_id in active_downloads:
         await message.reply("You already have a download in progress. Please wait for it to complete.")
         return
-    
+
+    trace = Trace(user_id=user_id, url=url)
+
+    # Route offline by extractor pattern or extension; only unknown links cost a HEAD request
+    if route is None:
+        with trace.span('route') as span:
+            route = await asyncio.get_running_loop().run_in_executor(None, url_dispatcher.resolve, url)
+            span.set(kind=route.kind, extractor=route.extractor)
+    url = route.url
+    trace.set(kind=route.kind, site=route.site)
+
     # Check if it's an image URL
-    if is_image_url(url):
+    if route.kind == 'image':
         # Get image info
-        info = await asyncio.get_event_loop().run_in_executor(None, get_image_info, url)
+        with trace.span('analysis'):
+            info = await asyncio.get_event_loop().run_in_executor(None, get_image_info, url)
         info_text = "Image info:\n"
         if info.get('content_type'):
             info_text += f"Type: {info['content_type']}\n"
@@ -167,67 +344,113 @@ async def process_single_url(message: types.Message, url: str):
         cancel_keyboard = types.InlineKeyboardMarkup(inline_keyboard=[[types.InlineKeyboardButton(text="Cancel", callback_data="cancel")]])
         status_msg = await message.reply("Downloading image...", reply_markup=cancel_keyboard)
         filepath = None
+        status, error = 'ok', None
         try:
             loop = asyncio.get_running_loop()
             task = loop.run_in_executor(None, download_image, url)
-            active_downloads[user_id] = {'url': url, 'task': task}
-            filepath = await task
-            await message.bot.send_photo(message.chat.id, types.FSInputFile(filepath))
+            active_downloads[user_id] = {'url': url, 'task': task, 'trace': trace}
+            with trace.span('download'):
+                filepath = await task
+            await send_traced(trace, message.bot.send_photo, message.chat.id, ThrottledInputFile(filepath, 'image'))
             await status_msg.edit_text("Image downloaded!")
         except asyncio.CancelledError:
+            status = 'cancelled'
             await status_msg.edit_text("Download cancelled.")
         except ValueError as e:
+            status, error = 'error', str(e)
             await status_msg.edit_text(f"Error: {str(e)}")
         except Exception as e:
+            status, error = 'error', str(e)
             await status_msg.edit_text("An unexpected error occurred.")
         finally:
             if user_id in active_downloads:
                 del active_downloads[user_id]
             if filepath:
-                cleanup_file(filepath)
+                with trace.span('cleanup'):
+                    cleanup_file(filepath)
+            trace.finish(status, error)
         return
     
-    if 'pinterest' in url.lower():
-        # Auto download with best quality for Pinterest
+    if route.kind in ('video', 'audio') or (is_pinterest(route) and route.extractor != 'PinterestCollection'):
+        # Auto download with best quality for Pinterest pins and direct media files
+        format_type = 'audio' if route.kind == 'audio' else 'video'
+        source = 'Pinterest' if is_pinterest(route) else 'link'
         cancel_keyboard = types.InlineKeyboardMarkup(inline_keyboard=[[types.InlineKeyboardButton(text="Cancel", callback_data="cancel")]])
-        status_msg = await message.reply("Downloading from Pinterest...", reply_markup=cancel_keyboard)
+        status_msg = await message.reply(f"Downloading from {source}...", reply_markup=cancel_keyboard)
         filepath = None
+        status, error = 'ok', None
+        trace.set(format_type=format_type, quality='best')
         try:
-            loop = asyncio.get_running_loop()
-            progress_callback = make_progress_cb(status_msg, loop)
-            task = asyncio.create_task(downloader.download_video(url, 'video', 'best', progress_callback))
-            active_downloads[user_id] = {'url': url, 'task': task}
-            filepath, info = await task
-            title = info.get('title', 'Pinterest video')
-            await message.bot.send_video(message.chat.id, types.FSInputFile(filepath), caption=title)
+            if job_queue:
+                # A worker downloads and sends the file
+                await run_queued_download(user_id, message.chat.id, status_msg, url, format_type, 'best', trace,
+                                          default_title=f'{source.capitalize()} {format_type}')
+            else:
+                with progress_renderer.track(status_msg, trace) as progress:
+                    task = asyncio.create_task(downloader.download_video(url, format_type, 'best', progress, trace))
+                    active_downloads[user_id] = {'url': url, 'task': task, 'trace': trace}
+                    filepath, info = await task
+                title = info.get('title', f'{source.capitalize()} {format_type}')
+                media = ThrottledInputFile(filepath, format_type, filename=upload_filename(filepath, title))
+                if format_type == 'audio':
+                    await send_traced(trace, message.bot.send_audio, message.chat.id, media, caption=title)
+                else:
+                    await send_traced(trace, message.bot.send_video, message.chat.id, media, caption=title)
             await status_msg.edit_text("Download complete!")
             # Add to history
             if user_id not in user_history:
                 user_history[user_id] = []
             user_history[user_id].append({
                 'url': url,
-                'type': 'video',
+                'type': format_type,
                 'timestamp': time.time()
             })
             user_history[user_id] = user_history[user_id][-10:]
         except asyncio.CancelledError:
+            status = 'cancelled'
             await status_msg.edit_text("Download cancelled.")
         except ValueError as e:
+            status, error = 'error', str(e)
             await status_msg.edit_text(f"Error: {str(e)}")
         except Exception as e:
+            status, error = 'error', str(e)
             await status_msg.edit_text("An unexpected error occurred.")
         finally:
             if user_id in active_downloads:
                 del active_downloads[user_id]
             if filepath:
-                cleanup_file(filepath)
+                with trace.span('cleanup'):
+                    cleanup_file(filepath)
+            trace.finish(status, error)
         return
     
     # Analyze video formats
     status_msg = await message.reply("Analyzing available formats...")
     
     try:
-        info = await asyncio.get_event_loop().run_in_executor(None, extract_video_info, url)
+        with trace.span('analysis') as span:
+            info = await run_in_site_slot(url, extract_video_info, url)
+            span.set(extractor=info.get('extractor_key'))
+
+        # Carousels and galleries are sent as albums without asking for a format
+        entries = carousel_entries(info)
+        if entries:
+            await process_carousel(message, status_msg, url, info, entries, trace)
+            return
+
+        # Playlists and channels can be downloaded in bulk
+        if is_bulk_playlist(info):
+            count = len(info.get('entries') or [])
+            more = '+' if count >= CAROUSEL_MAX_ITEMS else ''
+            keyboard = types.InlineKeyboardMarkup(inline_keyboard=[[
+                types.InlineKeyboardButton(text="All videos", callback_data="bulk_video"),
+                types.InlineKeyboardButton(text="All audio (MP3)", callback_data="bulk_audio"),
+            ]])
+            await status_msg.edit_text(
+                f"Playlist: {info.get('title') or 'Unknown'}\nItems: {count}{more} (up to {BULK_MAX_ITEMS} are downloaded)\n"
+                "Each item is sent as soon as it is ready.", reply_markup=keyboard)
+            active_downloads[user_id] = {'url': url, 'task': None, 'trace': trace, 'prompted_at': time.time()}
+            return
 
         # Show video info
         title = info.get('title', 'Unknown')
@@ -243,7 +466,8 @@ async def process_single_url(message: types.Message, url: str):
         await status_msg.edit_text(info_text)
 
         # Wait a bit or proceed
-        await asyncio.sleep(2)  # Give user time to see info
+        with trace.span('info_preview'):
+            await asyncio.sleep(2)  # Give user time to see info
 
         # Check for available video and audio (already have has_video, has_audio)
 
@@ -254,16 +478,18 @@ async def process_single_url(message: types.Message, url: str):
             buttons.append(types.InlineKeyboardButton(text="Audio (MP3)", callback_data="audio_mp3"))
 
         if not buttons:
+            trace.finish('error', 'no downloadable formats')
             await status_msg.edit_text("No downloadable formats found for this video.")
             return
 
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=[buttons])
         await status_msg.edit_text("Choose type:", reply_markup=keyboard)
 
-        # Store URL for later use
-        active_downloads[user_id] = {'url': url, 'task': None}
+        # Store URL for later use; the trace continues when the user picks a type
+        active_downloads[user_id] = {'url': url, 'task': None, 'trace': trace, 'prompted_at': time.time()}
         
     except Exception as e:
+        trace.finish('error', str(e))
         await status_msg.edit_text(f"Error analyzing video: {str(e)}")
 
 @router.message(F.text)
@@ -285,113 +511,23 @@ async def handle_url(message: types.Message):
     # Limit to 5 URLs per message
     urls = urls[:5]
     
+    accepted = []
     for url in urls:
         if not check_rate_limit(user_id):
             await message.reply(f"Rate limit exceeded for {url}. You can send up to {RATE_LIMIT} URLs per minute.")
             continue
-        await process_single_url(message, url)
-    
-    # Check if it's an image URL
-    if is_image_url(url):
-        # Get image info
-        info = await asyncio.get_event_loop().run_in_executor(None, get_image_info, url)
-        info_text = "Image info:\n"
-        if info.get('content_type'):
-            info_text += f"Type: {info['content_type']}\n"
-        if info.get('size'):
-            size_mb = info['size'] / (1024 * 1024)
-            info_text += f"Size: {size_mb:.2f} MB"
-        await message.reply(info_text)
-        
-        cancel_keyboard = types.InlineKeyboardMarkup(inline_keyboard=[[types.InlineKeyboardButton(text="Cancel", callback_data="cancel")]])
-        status_msg = await message.reply("Downloading image...", reply_markup=cancel_keyboard)
-        filepath = None
-        try:
-            loop = asyncio.get_running_loop()
-            task = loop.run_in_executor(None, download_image, url)
-            active_downloads[user_id] = {'url': url, 'task': task}
-            filepath = await task
-            await message.bot.send_photo(message.chat.id, types.FSInputFile(filepath))
-            await status_msg.edit_text("Image downloaded!")
-        except asyncio.CancelledError:
-            await status_msg.edit_text("Download cancelled.")
-        except ValueError as e:
-            await status_msg.edit_text(f"Error: {str(e)}")
-        except Exception as e:
-            await status_msg.edit_text("An unexpected error occurred.")
-        finally:
-            if user_id in active_downloads:
-                del active_downloads[user_id]
-            if filepath:
-                cleanup_file(filepath)
-        return
-    
-    if 'pinterest' in url.lower():
-        # Auto download with best quality for Pinterest
-        cancel_keyboard = types.InlineKeyboardMarkup(inline_keyboard=[[types.InlineKeyboardButton(text="Cancel", callback_data="cancel")]])
-        status_msg = await message.reply("Downloading from Pinterest...", reply_markup=cancel_keyboard)
-        filepath = None
-        try:
-            loop = asyncio.get_running_loop()
-            progress_callback = make_progress_cb(status_msg, loop)
-            task = asyncio.create_task(downloader.download_video(url, 'video', 'best', progress_callback))
-            active_downloads[user_id] = {'url': url, 'task': task}
-            filepath, info = await task
-            title = info.get('title', 'Pinterest video')
-            await message.bot.send_video(message.chat.id, types.FSInputFile(filepath), caption=title)
-            await status_msg.edit_text("Download complete!")
-        except ValueError as e:
-            await status_msg.edit_text(f"Error: {str(e)}")
-        except Exception as e:
-            await status_msg.edit_text("An unexpected error occurred.")
-        finally:
-            if user_id in active_downloads:
-                del active_downloads[user_id]
-            if filepath:
-                cleanup_file(filepath)
-    else:
-        # Analyze video formats
-        status_msg = await message.reply("Analyzing available formats...")
-        
-        try:
-            info = await asyncio.get_event_loop().run_in_executor(None, extract_video_info, url)
-
-            # Show video info
-            title = info.get('title', 'Unknown')
-            duration = info.get('duration')
-            if duration:
-                dur_str = f"{int(duration // 60)}:{int(duration % 60):02d}"
-            else:
-                dur_str = 'Unknown'
-            formats = info.get('formats', [])
-            has_video = any(fmt.get('vcodec') != 'none' for fmt in formats)
-            has_audio = any(fmt.get('acodec') != 'none' for fmt in formats)
-            info_text = f"Video info:\nTitle: {title}\nDuration: {dur_str}\nHas video: {has_video}, Has audio: {has_audio}"
-            await status_msg.edit_text(info_text)
-
-            # Wait a bit or proceed
-            await asyncio.sleep(2)  # Give user time to see info
-
-            # Check for available video and audio (already have has_video, has_audio)
-
-            buttons = []
-            if has_video:
-                buttons.append(types.InlineKeyboardButton(text="Video", callback_data="video_best"))
-            if has_audio:
-                buttons.append(types.InlineKeyboardButton(text="Audio (MP3)", callback_data="audio_mp3"))
-
-            if not buttons:
-                await status_msg.edit_text("No downloadable formats found for this video.")
-                return
+        accepted.append(url)
 
-            keyboard = types.InlineKeyboardMarkup(inline_keyboard=[buttons])
-            await status_msg.edit_text("Choose type:", reply_markup=keyboard)
+    # Several direct image links go out together as an album
+    loop = asyncio.get_running_loop()
+    routes = await asyncio.gather(*(loop.run_in_executor(None, url_dispatcher.resolve, url) for url in accepted))
+    images = [route.url for route in routes if route.kind == 'image']
+    if len(images) > 1:
+        await process_image_batch(message, images)
+        routes = [route for route in routes if route.kind != 'image']
 
-            # Store URL for later use
-            active_downloads[user_id] = {'url': url, 'task': None}
-            
-        except Exception as e:
-            await status_msg.edit_text(f"Error analyzing video: {str(e)}")
+    for route in routes:
+        await process_single_url(message, route.url, route)
 
 @router.callback_query(F.data.in_(["video_best", "audio_mp3"]))
 async def handle_type_selection(callback: types.CallbackQuery):
@@ -416,6 +552,11 @@ async def handle_type_selection(callback: types.CallbackQuery):
         return
     
     url = active_downloads[user_id]['url']
+    trace = active_downloads[user_id].get('trace') or Trace(user_id=user_id, url=url)
+    prompted_at = active_downloads[user_id].get('prompted_at')
+    if prompted_at:
+        trace.record('format_choice', prompted_at, time.time(), choice=data)
+    trace.set(format_type=format_type, quality=quality)
     
     await callback.answer()
     
@@ -424,39 +565,46 @@ async def handle_type_selection(callback: types.CallbackQuery):
     status_msg = await callback.message.reply("Downloading... This may take a few minutes.", reply_markup=cancel_keyboard)
     
     filepath = None
+    status, error = 'ok', None
     try:
-        # Set up progress callback (throttled + inline bar)
-        loop = asyncio.get_running_loop()
-        progress_callback = make_progress_cb(status_msg, loop)
-
-        # Start download task
-        task = asyncio.create_task(downloader.download_video(url, format_type, quality, progress_callback))
-        active_downloads[user_id]['task'] = task
+        if job_queue:
+            # A worker downloads and sends the file
+            await run_queued_download(user_id, callback.message.chat.id, status_msg, url, format_type, quality, trace,
+                                      default_title='Downloaded video', with_duration=True)
+        else:
+            # Start download task; its progress is shown on status_msg (inline bar)
+            with progress_renderer.track(status_msg, trace) as progress:
+                task = asyncio.create_task(downloader.download_video(url, format_type, quality, progress, trace))
+                active_downloads[user_id]['task'] = task
 
-        filepath, info = await task
+                filepath, info = await task
         
-        # Prepare caption
-        title = info.get('title', 'Downloaded video')
-        duration = info.get('duration')
-        if duration:
-            dur = int(duration)
-            minutes = dur // 60
-            seconds = dur % 60
-            title += f" ({minutes}:{seconds:02d})"
+            # Prepare caption
+            title = info.get('title', 'Downloaded video')
+            duration = info.get('duration')
+            if duration:
+                dur = int(duration)
+                minutes = dur // 60
+                seconds = dur % 60
+                title += f" ({minutes}:{seconds:02d})"
         
-        # Send the file
-        if format_type == 'audio':
-            await callback.bot.send_audio(
-                callback.message.chat.id,
-                types.FSInputFile(filepath),
-                caption=title
-            )
-        else:
-            await callback.bot.send_video(
-                callback.message.chat.id,
-                types.FSInputFile(filepath),
-                caption=title
-            )
+            # Send the file
+            if format_type == 'audio':
+                await send_traced(
+                    trace,
+                    callback.bot.send_audio,
+                    callback.message.chat.id,
+                    ThrottledInputFile(filepath, 'audio', filename=upload_filename(filepath, info.get('title'))),
+                    caption=title
+                )
+            else:
+                await send_traced(
+                    trace,
+                    callback.bot.send_video,
+                    callback.message.chat.id,
+                    ThrottledInputFile(filepath, 'video', filename=upload_filename(filepath, info.get('title'))),
+                    caption=title
+                )
         
         await callback.message.edit_text("Download complete! File sent above.")
         
@@ -471,10 +619,13 @@ async def handle_type_selection(callback: types.CallbackQuery):
         user_history[user_id] = user_history[user_id][-10:]
         
     except asyncio.CancelledError:
+        status = 'cancelled'
         await callback.message.edit_text("Download cancelled.")
     except ValueError as e:
+        status, error = 'error', str(e)
         await callback.message.edit_text(f"Error: {str(e)}")
     except Exception as e:
+        status, error = 'error', str(e)
         await callback.message.edit_text(f"An unexpected error occurred: {str(e)}")
     finally:
         # Cleanup
@@ -484,7 +635,96 @@ async def handle_type_selection(callback: types.CallbackQuery):
                 task.cancel()
             del active_downloads[user_id]
         if filepath:
-            cleanup_file(filepath)
+            with trace.span('cleanup'):
+                cleanup_file(filepath)
+        trace.finish(status, error)
+
+@router.callback_query(F.data.in_(["bulk_video", "bulk_audio"]))
+async def handle_bulk_selection(callback: types.CallbackQuery):
+    """
+    Handle the bulk download choice for a playlist or channel.
+    """
+    user_id = callback.from_user.id
+    if user_id not in active_downloads or active_downloads[user_id].get('task'):
+        await callback.answer("No playlist waiting for a choice.")
+        return
+
+    format_type, quality = ('audio', 'mp3') if callback.data == "bulk_audio" else ('video', 'best')
+    url = active_downloads[user_id]['url']
+    trace = active_downloads[user_id].get('trace') or Trace(user_id=user_id, url=url)
+    prompted_at = active_downloads[user_id].get('prompted_at')
+    if prompted_at:
+        trace.record('format_choice', prompted_at, time.time(), choice=callback.data)
+    trace.set(kind='bulk', format_type=format_type, quality=quality)
+    await callback.answer()
+
+    chat_id = callback.message.chat.id
+    status_msg = await callback.message.reply("Listing playlist...", reply_markup=bulk_keyboard(False))
+
+    async def send(filepath: str, info: dict, index: int):
+        kind = downloaded_kind(filepath, info)
+        method = {'image': callback.bot.send_photo, 'audio': callback.bot.send_audio}.get(kind, callback.bot.send_video)
+        caption = f"{index}. {info.get('title') or ''}"[:1024]
+        filename = upload_filename(filepath, info.get('title'))
+        try:
+            await send_traced(trace, method, chat_id, ThrottledInputFile(filepath, kind, filename=filename), caption=caption)
+        except TelegramRetryAfter as e:
+            # Long playlists can hit Telegram's flood limit; wait it out once
+            await asyncio.sleep(e.retry_after)
+            await send_traced(trace, method, chat_id, ThrottledInputFile(filepath, kind, filename=filename), caption=caption)
+
+    async def report(job: BulkJob):
+        await status_msg.edit_text(bulk_status_text(job), reply_markup=bulk_keyboard(job.paused))
+
+    job = BulkJob(url, format_type, quality, send, report, trace)
+    status, error = 'ok', None
+    try:
+        task = asyncio.create_task(job.run())
+        active_downloads[user_id].update(task=task, bulk=job)
+        await task
+        await status_msg.edit_text(bulk_status_text(job) + "\nDone!")
+        # Add to history
+        if user_id not in user_history:
+            user_history[user_id] = []
+        user_history[user_id].append({
+            'url': url,
+            'type': 'playlist',
+            'timestamp': time.time()
+        })
+        user_history[user_id] = user_history[user_id][-10:]
+    except asyncio.CancelledError:
+        status = 'cancelled'
+        await status_msg.edit_text(bulk_status_text(job) + "\nCancelled.")
+    except ValueError as e:
+        status, error = 'error', str(e)
+        await status_msg.edit_text(bulk_status_text(job) + f"\nError: {str(e)}")
+    except Exception as e:
+        status, error = 'error', str(e)
+        await status_msg.edit_text(bulk_status_text(job) + "\nAn unexpected error occurred.")
+    finally:
+        if user_id in active_downloads:
+            del active_downloads[user_id]
+        trace.finish(status, error)
+
+@router.callback_query(F.data.in_(["bulk_pause", "bulk_resume"]))
+async def handle_bulk_pause(callback: types.CallbackQuery):
+    """
+    Pause or resume the user's bulk download.
+    """
+    job = active_downloads.get(callback.from_user.id, {}).get('bulk')
+    if not job:
+        await callback.answer("No bulk download in progress.")
+        return
+    if callback.data == "bulk_pause":
+        job.pause()
+        await callback.answer("Paused. Items already downloading will still be sent.")
+    else:
+        job.resume()
+        await callback.answer("Resumed.")
+    try:
+        await callback.message.edit_text(bulk_status_text(job), reply_markup=bulk_keyboard(job.paused))
+    except Exception:
+        pass
 
 @router.callback_query(F.data == "cancel")
 async def handle_cancel(callback: types.CallbackQuery):
@@ -496,6 +736,10 @@ async def handle_cancel(callback: types.CallbackQuery):
         task = active_downloads[user_id].get('task')
         if task and not task.done():
             task.cancel()
+        trace = active_downloads[user_id].get('trace')
+        if trace and not task:
+            # Cancelled at the format prompt; running jobs finish their own trace
+            trace.finish('cancelled')
         del active_downloads[user_id]
         await callback.message.edit_text("Download cancelled.")
     await callback.answer()
@@ -0,0 +1,192 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+from config import JOB_QUEUE, QUEUE_VISIBILITY_TIMEOUT, QUEUE_MAX_ATTEMPTS, QUEUE_RETENTION
+
+# Job states; a job ends in one of FINISHED
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    cancel INTEGER NOT NULL DEFAULT 0,
+    progress TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, user_id);
+"""
+
+
+class Job(NamedTuple):
+    """
+    A job claimed by a worker. attempts counts claims, including this one.
+    """
+    id: int
+    user_id: int
+    chat_id: int
+    payload: dict
+    attempts: int
+    created: float
+
+
+class JobQueue:
+    """
+    Durable job queue in a SQLite file, shared by the bot and any number of worker processes.
+
+    A claimed job is leased to its worker for `visibility_timeout` seconds and the worker renews
+    the lease with heartbeats. If the worker dies the lease runs out and the job is queued again,
+    up to `max_attempts` claims. A user's jobs run one at a time in the order they were enqueued.
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = QUEUE_VISIBILITY_TIMEOUT,
+                 max_attempts: int = QUEUE_MAX_ATTEMPTS, retention: float = QUEUE_RETENTION):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retention = retention
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode; transactions are opened explicitly where several statements must be atomic
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def enqueue(self, user_id: int, chat_id: int, payload: dict) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                'INSERT INTO jobs (user_id, chat_id, payload, status, created, updated) VALUES (?, ?, ?, ?, ?, ?)',
+                (user_id, chat_id, json.dumps(payload), QUEUED, now, now))
+            return cursor.lastrowid
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """
+        Lease the oldest job that is ready to run to `worker`, or return None if there is none.
+        A job is ready if no earlier job of the same user is queued or running.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._expire(now)
+                row = self._db.execute(
+                    'SELECT id, user_id, chat_id, payload, attempts, created FROM jobs AS j '
+                    'WHERE status = ? AND NOT EXISTS (SELECT 1 FROM jobs AS o WHERE o.user_id = j.user_id '
+                    'AND (o.status = ? OR (o.status = ? AND o.id < j.id))) ORDER BY id LIMIT 1',
+                    (QUEUED, RUNNING, QUEUED)).fetchone()
+                if row:
+                    self._db.execute(
+                        'UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, '
+                        'started = ?, updated = ? WHERE id = ?',
+                        (RUNNING, worker, now + self.visibility_timeout, now, now, row[0]))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        if not row:
+            return None
+        return Job(row[0], row[1], row[2], json.loads(row[3]), row[4] + 1, row[5])
+
+    def _expire(self, now: float) -> None:
+        # Leases that ran out belong to dead or stuck workers: run the job again, unless it was
+        # cancelled or has used up its attempts
+        self._db.execute(
+            'UPDATE jobs SET status = ?, error = ?, updated = ? WHERE status = ? AND lease_until < ? AND cancel = 1',
+            (CANCELLED, None, now, RUNNING, now))
+        self._db.execute(
+            'UPDATE jobs SET status = ?, error = ?, updated = ? WHERE status = ? AND lease_until < ? AND attempts >= ?',
+            (FAILED, 'The download worker stopped responding', now, RUNNING, now, self.max_attempts))
+        self._db.execute(
+            'UPDATE jobs SET status = ?, worker = NULL, progress = NULL, updated = ? WHERE status = ? AND lease_until < ?',
+            (QUEUED, now, RUNNING, now))
+
+    def heartbeat(self, job_id: int, worker: str, progress: list = None) -> bool:
+        """
+        Renew the worker's lease and publish the job's latest progress (JobProgress.snapshot()), if given.
+        Returns False if the worker should stop: the job was cancelled or its lease was lost.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                'UPDATE jobs SET lease_until = ?, progress = COALESCE(?, progress), updated = ? '
+                'WHERE id = ? AND worker = ? AND status = ? AND cancel = 0',
+                (now + self.visibility_timeout, json.dumps(progress) if progress else None, now, job_id, worker, RUNNING))
+            return cursor.rowcount == 1
+
+    def finish(self, job_id: int, worker: str, status: str, error: str = None) -> bool:
+        """
+        Record the outcome of a job. Returns False if the worker no longer held the job.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                'UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated = ? '
+                'WHERE id = ? AND worker = ? AND status = ?',
+                (status, error, now, job_id, worker, RUNNING))
+            self._db.execute('DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated < ?',
+                             (*FINISHED, now - self.retention))
+            return cursor.rowcount == 1
+
+    def release(self, job_id: int, worker: str) -> None:
+        """
+        Hand a job back without using up an attempt, e.g. when the worker shuts down.
+        """
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL, progress = NULL, '
+                'attempts = attempts - 1, updated = ? WHERE id = ? AND worker = ? AND status = ?',
+                (QUEUED, time.time(), job_id, worker, RUNNING))
+
+    def cancel(self, job_id: int) -> None:
+        """
+        Cancel a job. A queued job is dropped; a running one is stopped by its worker's next heartbeat.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute('UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status = ?',
+                             (CANCELLED, now, job_id, QUEUED))
+            self._db.execute('UPDATE jobs SET cancel = 1, updated = ? WHERE id = ? AND status = ?',
+                             (now, job_id, RUNNING))
+
+    def get(self, job_id: int) -> Optional[dict]:
+        """
+        State of a job: status, error, latest progress and, while queued, the number of jobs ahead of it.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT status, error, progress FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if not row:
+                return None
+            ahead = 0
+            if row[0] == QUEUED:
+                ahead = self._db.execute('SELECT COUNT(*) FROM jobs WHERE status IN (?, ?) AND id < ?',
+                                         (QUEUED, RUNNING, job_id)).fetchone()[0]
+        return {'status': row[0], 'error': row[1], 'progress': json.loads(row[2]) if row[2] else None, 'ahead': ahead}
+
+    def stats(self) -> dict:
+        """
+        Number of jobs per state.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {QUEUED: 0, RUNNING: 0, **dict(rows)}
+
+
+# Global instance; None when downloads run in the bot process
+job_queue = JobQueue(JOB_QUEUE) if JOB_QUEUE else None
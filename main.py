@@ -1,22 +1,45 @@
 import asyncio
 import logging
-import time
 import threading
 import os
+import json
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from aiogram import Bot, Dispatcher
-from config import BOT_TOKEN, LOG_LEVEL
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from config import BOT_TOKEN, LOG_LEVEL, LOOP_MONITOR, TELEGRAM_API_URL
 from handlers import router
-
-start_time = time.time()
+from startup import readiness, warm_up, update_descriptions
+from breakers import breaker_status
+from bandwidth import bandwidth_status
+from monitoring import loop_monitor, format_prometheus
+from jobqueue import job_queue
+from progress import progress_renderer
 
 class HealthHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         if self.path == '/health':
+            status = {'status': 'ok', 'breakers': breaker_status(), 'bandwidth': bandwidth_status(), 'loop': loop_monitor.metrics()}
+            if job_queue:
+                status['queue'] = job_queue.stats()
+            body = json.dumps(status)
             self.send_response(200)
-            self.send_header('Content-type', 'text/plain')
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(body.encode())
+        elif self.path == '/ready':
+            state = readiness.snapshot()
+            body = json.dumps({'status': 'ready' if state['ready'] else 'starting', **state})
+            self.send_response(200 if state['ready'] else 503)
+            self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(b'OK')
+            self.wfile.write(body.encode())
+        elif self.path == '/metrics':
+            body = format_prometheus({**loop_monitor.metrics(), **progress_renderer.metrics()})
+            self.send_response(200)
+            self.send_header('Content-type', 'text/plain; version=0.0.4')
+            self.end_headers()
+            self.wfile.write(body.encode())
         else:
             self.send_response(404)
             self.end_headers()
@@ -32,23 +55,40 @@ threading.Thread(target=run_health_server, daemon=True).start()
 # Configure logging
 logging.basicConfig(level=getattr(logging, LOG_LEVEL.upper(), logging.INFO))
 
+async def on_startup(bot: Bot):
+    """
+    Runs as polling starts. Slow startup work happens in the background so updates are served right away.
+    """
+    readiness.mark('polling')
+    loop = asyncio.get_running_loop()
+    for task in (loop.run_in_executor(None, warm_up), asyncio.create_task(sync_descriptions(bot))):
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+async def sync_descriptions(bot: Bot):
+    try:
+        if await update_descriptions(bot):
+            logging.info("Bot descriptions updated")
+    except Exception as e:
+        logging.warning("Could not update bot descriptions: %s", e)
+
+# Keeps startup tasks referenced until they finish
+background_tasks = set()
+
 async def main():
     """
     Main entry point for the bot.
     """
-    bot = Bot(token=BOT_TOKEN)
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    bot = Bot(token=BOT_TOKEN, session=session)
     dp = Dispatcher()
 
-    # Update bot description
-    await bot.set_my_description(
-        "A Telegram bot for downloading videos and images from URLs. "
-        "Supports platforms like YouTube, TikTok, Instagram, Facebook, and more. "
-        "Send URLs to download media easily!\n\nCreated by GhostScript."
-    )
-    await bot.set_my_short_description("Download videos and images from URLs. Created by GhostScript.")
+    if LOOP_MONITOR:
+        loop_monitor.start()
 
     # Include handlers
     dp.include_router(router)
+    dp.startup.register(on_startup)
     
     # Start polling
     logging.info("Starting bot...")
@@ -0,0 +1,112 @@
+import asyncio
+from aiogram import types
+from config import MEDIA_GROUP_SIZE, MEDIA_DOWNLOAD_CONCURRENCY
+from bandwidth import ThrottledInputFile
+from utils import cleanup_file, get_file_size
+from tracing import NO_TRACE
+
+# Album item type per downloaded kind; audio can only be grouped with audio
+INPUT_MEDIA = {
+    'image': types.InputMediaPhoto,
+    'video': types.InputMediaVideo,
+    'audio': types.InputMediaAudio,
+}
+
+
+def _album(kind: str) -> str:
+    return 'audio' if kind == 'audio' else 'visual'
+
+
+class MediaGroupSender:
+    """
+    Collects the downloaded items of one request and sends them as albums of up to `size` items,
+    one send_media_group call per album instead of one send call per item.
+    Files are removed once their album has been sent (or has failed).
+    """
+
+    def __init__(self, bot, chat_id: int, trace=None, size: int = MEDIA_GROUP_SIZE, on_sent=None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.trace = trace or NO_TRACE
+        self.size = size
+        self.on_sent = on_sent
+        self.items = []
+        self.sent = 0
+
+    async def add(self, filepath: str, kind: str, caption: str = None, filename: str = None) -> None:
+        """
+        filename: name to send the file under (see utils.upload_filename); default is its name on disk
+        """
+        # Photos and videos share an album; audio needs its own
+        if self.items and _album(self.items[0][1]) != _album(kind):
+            await self.flush()
+        self.items.append((filepath, kind, caption, filename))
+        if len(self.items) >= self.size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        items, self.items = self.items, []
+        if not items:
+            return
+        size = sum(get_file_size(filepath) for filepath, *_ in items)
+        try:
+            if len(items) == 1:
+                filepath, kind, caption, filename = items[0]
+                send = {'image': self.bot.send_photo, 'audio': self.bot.send_audio}.get(kind, self.bot.send_video)
+                with self.trace.span('upload', method=send.__name__, items=1, bytes=size):
+                    await send(self.chat_id, ThrottledInputFile(filepath, kind, filename=filename), caption=caption)
+            else:
+                media = [INPUT_MEDIA[kind](media=ThrottledInputFile(filepath, kind, filename=filename), caption=caption)
+                         for filepath, kind, caption, filename in items]
+                with self.trace.span('upload', method='send_media_group', items=len(items), bytes=size):
+                    await self.bot.send_media_group(self.chat_id, media)
+        finally:
+            for filepath, *_ in items:
+                cleanup_file(filepath)
+        self.sent += len(items)
+        if self.on_sent:
+            await self.on_sent(self.sent)
+
+    def discard(self) -> None:
+        """
+        Drop queued items that will not be sent, removing their files.
+        """
+        for filepath, *_ in self.items:
+            cleanup_file(filepath)
+        self.items = []
+
+
+async def download_and_send(sender: MediaGroupSender, downloads: list, concurrency: int = MEDIA_DOWNLOAD_CONCURRENCY) -> list:
+    """
+    Run downloads concurrently, at most `concurrency` at a time, and hand finished items to
+    `sender` in their original order, so the first album is uploading while later items download.
+    downloads: async callables returning (filepath, kind, caption, filename).
+    Returns the error messages of items that failed; the other items are sent.
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(download):
+        async with slots:
+            return await download()
+
+    tasks = [asyncio.ensure_future(run(download)) for download in downloads]
+    errors = []
+    try:
+        for task in tasks:
+            try:
+                filepath, kind, caption, filename = await task
+            except ValueError as e:
+                errors.append(str(e))
+                continue
+            await sender.add(filepath, kind, caption, filename)
+        await sender.flush()
+    finally:
+        # On cancellation or an upload error, stop the remaining downloads and drop their files
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        sender.discard()
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception() is None:
+                cleanup_file(task.result()[0])
+    return errors
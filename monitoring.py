@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from config import LOOP_MONITOR_INTERVAL, LOOP_LAG_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag and catches blocking calls.
+    A heartbeat task sleeps for `interval` and records how late it wakes up. A watchdog thread
+    checks the heartbeat; when the loop has been stuck for more than `threshold` it logs the
+    loop thread's current stack, i.e. the code that is blocking it. Cost is one timer per
+    interval on the loop and one wakeup per threshold/2 in the thread.
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.lag_total = 0.0
+        self.ticks = 0
+        self.stalls = 0
+        self._beat = 0.0
+        self._loop_thread = None
+        self._task = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """
+        Start monitoring the running loop. Must be called from inside the loop.
+        """
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name='loop-watchdog', daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    def metrics(self) -> dict:
+        return {
+            'loop_lag_seconds': round(self.lag, 6),
+            'loop_lag_max_seconds': round(self.max_lag, 6),
+            'loop_lag_avg_seconds': round(self.lag_total / self.ticks, 6) if self.ticks else 0.0,
+            'loop_stalls_total': self.stalls,
+        }
+
+    async def _heartbeat(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - start - self.interval)
+            self.lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.lag_total += lag
+            self.ticks += 1
+            self._beat = now
+
+    def _watchdog(self) -> None:
+        reported = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked <= self.threshold or reported == beat:
+                continue
+            # Report each stall once, with the stack the loop thread is stuck in right now
+            reported = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = ''.join(traceback.format_stack(frame)) if frame else '<stack unavailable>\n'
+            logger.warning("Event loop blocked for %.3fs, loop thread is at:\n%s", blocked, stack)
+
+
+def format_prometheus(metrics: dict) -> str:
+    """
+    Render a flat metrics dict in the Prometheus text format.
+    """
+    return ''.join(f"telegram_downloader_{name} {value}\n" for name, value in metrics.items())
+
+
+# Global instance
+loop_monitor = LoopMonitor()
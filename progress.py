@@ -0,0 +1,191 @@
+import asyncio
+from contextlib import contextmanager
+from config import PROGRESS_INTERVAL
+from bandwidth import format_rate
+from tracing import NO_TRACE
+
+# Job phases, in the order a job goes through them
+QUEUED, STARTING, DOWNLOADING, PROCESSING = range(4)
+
+BAR_LENGTH = 25
+
+
+class JobProgress:
+    """
+    Progress of one job as plain numbers. The download thread writes it on every yt-dlp tick
+    with a few attribute assignments (no parsing, formatting or locking); the renderer reads it
+    on its own schedule. A read can catch a tick half-written, which the next tick corrects.
+    """
+
+    __slots__ = ('phase', 'downloaded', 'total', 'speed', 'eta', 'ahead', 'message', 'events')
+
+    def __init__(self):
+        self.phase = STARTING
+        self.downloaded = 0
+        self.total = 0
+        self.speed = 0.0
+        self.eta = None
+        self.ahead = 0
+        self.message = None
+        self.events = 0
+
+    def hook(self, d: dict) -> None:
+        """
+        yt-dlp progress hook.
+        """
+        self.events += 1
+        status = d['status']
+        if status == 'downloading':
+            self.downloaded = d.get('downloaded_bytes') or 0
+            self.total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            self.speed = d.get('speed') or 0.0
+            self.eta = d.get('eta')
+            self.phase = DOWNLOADING
+            self.message = None
+        elif status == 'finished':
+            # One part is done; merging/postprocessing or the next part may follow
+            self.phase = PROCESSING
+
+    def info(self, message: str) -> None:
+        """
+        Show a note (retry, fallback) until the download moves on.
+        """
+        self.message = message
+
+    def queued(self, ahead: int) -> None:
+        self.phase = QUEUED
+        self.ahead = ahead
+
+    @property
+    def percent(self) -> float:
+        if not self.total:
+            return 0.0
+        return min(100.0, 100.0 * self.downloaded / self.total)
+
+    def snapshot(self) -> list:
+        """
+        Compact form for publishing to another process, see restore().
+        """
+        return [self.phase, self.downloaded, self.total, self.speed, self.eta, self.message]
+
+    def restore(self, snapshot: list) -> None:
+        self.phase, self.downloaded, self.total, self.speed, self.eta, self.message = snapshot
+
+    def key(self) -> tuple:
+        """
+        What the rendered text depends on, coarsened to what is worth an edit: phase, whole
+        percent, queue position and note. Speed and ETA are refreshed along with the percent.
+        """
+        return (self.phase, int(self.percent), self.ahead if self.phase == QUEUED else 0, self.message)
+
+    def render(self) -> str:
+        if self.message:
+            return f"ℹ️ {self.message}"
+        if self.phase == QUEUED:
+            return f"⏳ Queued, {self.ahead} job(s) ahead..."
+        if self.phase == PROCESSING:
+            return "✅ Download finished, processing..."
+        percent = self.percent
+        filled = int(percent / 100.0 * BAR_LENGTH)
+        bar = '▰' * filled + '▱' * (BAR_LENGTH - filled)
+        speed = format_rate(self.speed) if self.speed else 'N/A'
+        return f"📥 Downloading: [{bar}] {percent:5.1f}% | ⚡ Speed: {speed} | ⏱️ ETA: {format_eta(self.eta)}"
+
+
+def format_eta(eta) -> str:
+    if eta is None:
+        return 'N/A'
+    eta = int(eta)
+    if eta >= 3600:
+        return f"{eta // 3600}:{eta % 3600 // 60:02d}:{eta % 60:02d}"
+    return f"{eta // 60:02d}:{eta % 60:02d}"
+
+
+class _Tracked:
+    __slots__ = ('message', 'trace', 'rendered', 'edit')
+
+    def __init__(self, message, trace, rendered):
+        self.message = message
+        self.trace = trace
+        self.rendered = rendered
+        self.edit = None
+
+
+class ProgressRenderer:
+    """
+    Renders the progress of every active job from one task on the event loop. Every `interval`
+    seconds it reads each job's JobProgress and edits the job's status message only if what it
+    would show has changed, so work grows with the number of jobs, not with the rate of
+    progress events, and download threads never schedule anything onto the loop.
+    """
+
+    def __init__(self, interval: float = PROGRESS_INTERVAL):
+        self.interval = interval
+        self.jobs = {}
+        self.ticks = 0
+        self.edits = 0
+        self.unchanged = 0
+        self._task = None
+
+    @contextmanager
+    def track(self, message, trace=None):
+        """
+        Render a JobProgress onto `message` while the block runs:
+
+            with progress_renderer.track(status_msg, trace) as progress:
+                await downloader.download_video(url, 'video', 'best', progress, trace)
+
+        On exit an edit still in flight is cancelled, so it cannot overwrite the caller's final text.
+        """
+        progress = JobProgress()
+        tracked = _Tracked(message, trace or NO_TRACE, progress.key())
+        self.jobs[progress] = tracked
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        try:
+            yield progress
+        finally:
+            del self.jobs[progress]
+            if tracked.edit and not tracked.edit.done():
+                tracked.edit.cancel()
+            tracked.trace.incr('progress_events', progress.events)
+
+    async def _run(self) -> None:
+        try:
+            while self.jobs:
+                await asyncio.sleep(self.interval)
+                self.ticks += 1
+                for progress, tracked in list(self.jobs.items()):
+                    # One edit per message at a time; a slow one just delays that job's next edit
+                    if tracked.edit and not tracked.edit.done():
+                        continue
+                    key = progress.key()
+                    if key == tracked.rendered:
+                        self.unchanged += 1
+                        continue
+                    tracked.rendered = key
+                    tracked.edit = asyncio.ensure_future(self._edit(tracked.message, progress.render()))
+                    tracked.trace.incr('progress_edits')
+                    self.edits += 1
+        finally:
+            self._task = None
+
+    @staticmethod
+    async def _edit(message, text: str) -> None:
+        try:
+            # Keep the message's buttons (Cancel) in place
+            await message.edit_text(text, reply_markup=message.reply_markup)
+        except Exception:
+            pass
+
+    def metrics(self) -> dict:
+        return {
+            'progress_jobs': len(self.jobs),
+            'progress_ticks_total': self.ticks,
+            'progress_edits_total': self.edits,
+            'progress_unchanged_total': self.unchanged,
+        }
+
+
+# Global instance
+progress_renderer = ProgressRenderer()
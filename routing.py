@@ -0,0 +1,292 @@
+import re
+import threading
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, unquote_plus
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg')
+VIDEO_EXTS = ('.mp4', '.webm', '.mkv', '.mov', '.m4v')
+AUDIO_EXTS = ('.mp3', '.m4a', '.ogg', '.opus', '.wav', '.flac', '.aac')
+
+# Query parameters that only identify who shared a link, never what it points to
+TRACKING_PARAMS = {'si', 'feature', 'fbclid', 'gclid', 'igshid', 'igsh', 'mibextid', 'ref_src', 'ref_url', 'pp'}
+
+# Host prefixes that do not change which media a URL points to
+HOST_PREFIXES = ('www.', 'm.', 'mobile.')
+
+# Host labels too common to narrow down the extractor candidates
+COMMON_LABELS = {'www', 'm', 'mobile', 'com', 'net', 'org', 'co', 'tv', 'de', 'fr', 'uk', 'ru', 'io'}
+
+_CASE_CLASS = re.compile(r'\[([a-zA-Z])([a-zA-Z])\]')
+_VERBOSE_FLAG = re.compile(r'\s*\(\?[a-z]*x')
+_VERBOSE_JUNK = re.compile(r'(?m)(?<=\s)#.*$|\s+')
+_SCHEME_GROUP_END = re.compile(r'(?:\|//)?\)\??')
+# Rewrites applied to the host part so only literal labels remain as words:
+# named groups become plain groups, "(?:sub\.)?" prefixes become a dot,
+# character classes and escapes become '#', counted repeats become '*'
+_HOST_REWRITES = (
+    (re.compile(r'\(\?P<\w+>'), '('),
+    (re.compile(r'\\\.\)[?*+]?'), '.'),
+    (re.compile(r'\[(?:\\.|[^\]])*\]'), '#'),
+    (re.compile(r'\{\d*,?\d*\}'), '*'),
+    (re.compile(r'\\\.'), '.'),
+    (re.compile(r'\\.'), '#'),
+)
+# A word glued to something variable in front of it, e.g. '(?:jio)?saavn' or '\w+tube'
+_PARTIAL_LABEL = re.compile(r'(?:(?<=[#?*+])|(?<=\)[?*+]))[a-z0-9]', re.I)
+_LABEL = re.compile(r'(?<![a-z0-9-])[a-z0-9][a-z0-9-]*', re.I)
+
+
+class Route(NamedTuple):
+    """
+    Offline classification of a URL.
+    kind is one of 'image', 'video', 'audio' (direct media files), 'extractor' or 'generic'.
+    site groups extractors of the same service (e.g. 'youtube' for videos, shorts and playlists)
+    and falls back to the host for links no extractor claims.
+    url is the link as the user sent it, which is what gets fetched; tracking parameters are only
+    dropped for matching and for the cache key.
+    """
+    kind: str
+    url: str
+    extractor: Optional[str] = None
+    media_id: Optional[str] = None
+    site: Optional[str] = None
+
+    @property
+    def key(self) -> tuple:
+        """
+        Cache key that is equal for links pointing to the same media.
+        """
+        if self.media_id:
+            return (self.extractor, self.media_id)
+        return (self.extractor or self.kind, canonicalize_url(self.url))
+
+
+def strip_tracking(url: str) -> str:
+    """
+    Remove share/tracking query parameters and the fragment from a URL, for matching and cache keys.
+    The remaining parameters are kept exactly as written.
+    """
+    parts = urlsplit(url)
+    query = [param for param in parts.query.split('&') if param and not _is_tracking(param)]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, '&'.join(query), ''))
+
+
+def _is_tracking(param: str) -> bool:
+    name = unquote_plus(param.split('=', 1)[0])
+    return name in TRACKING_PARAMS or name.startswith('utm_')
+
+
+def canonical_host(url: str) -> str:
+    """
+    Lowercase host of a URL without www./m./mobile. prefixes.
+    """
+    host = (urlsplit(url).hostname or '').lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            return host[len(prefix):]
+    return host
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalize a URL so equivalent links compare equal: https scheme, lowercase host without
+    www./m. prefixes or default port, no tracking parameters, sorted query.
+    """
+    parts = urlsplit(strip_tracking(url))
+    host = canonical_host(url)
+    if parts.port and parts.port not in (80, 443):
+        host = f'{host}:{parts.port}'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit(('https', host, parts.path.rstrip('/') or '/', query, ''))
+
+
+def _extractor_site(ie) -> str:
+    """
+    Name of the yt-dlp module an extractor lives in, e.g. 'youtube' for both Youtube and YoutubeTab.
+    """
+    # Lazy extractors keep the real module in _module; avoid getattr, which would load the real class
+    module = ie.__dict__.get('_module') or ie.__module__
+    return module.split('.')[2] if module.count('.') >= 2 else ie.ie_key().lower()
+
+
+def media_kind(path: str) -> Optional[str]:
+    path = path.lower()
+    if path.endswith(IMAGE_EXTS):
+        return 'image'
+    if path.endswith(VIDEO_EXTS):
+        return 'video'
+    if path.endswith(AUDIO_EXTS):
+        return 'audio'
+    return None
+
+
+def _host_parts(pattern: str) -> list:
+    """
+    Return the parts of a _VALID_URL pattern between each '://' and the next top-level '/' or '|'.
+    """
+    hosts = []
+    start = pattern.find('://')
+    while start >= 0:
+        start += 3
+        # Skip the end of a scheme group such as '(?:https?://|//)' or '(?:https?://)?'
+        scheme_end = _SCHEME_GROUP_END.match(pattern, start)
+        if scheme_end:
+            start = scheme_end.end()
+        depth = 0
+        in_class = False
+        i = start
+        while i < len(pattern):
+            c = pattern[i]
+            if c == '\\':
+                i += 2
+                continue
+            if in_class:
+                in_class = c != ']'
+            elif c == '[':
+                in_class = True
+            elif c == '(':
+                depth += 1
+            elif c == ')':
+                depth -= 1
+                if depth < 0:
+                    break
+            elif c in '/|' and depth == 0:
+                break
+            i += 1
+        hosts.append(pattern[start:i])
+        start = pattern.find('://', i)
+    return hosts
+
+
+def _host_keys(pattern: str) -> Optional[set]:
+    """
+    Index keys (two-character label prefixes) a pattern's host can start a label with.
+    Returns None if the host cannot be narrowed down safely, e.g. '[^/]+' or '(?:jio)?saavn'.
+    """
+    if _VERBOSE_FLAG.match(pattern):
+        pattern = _VERBOSE_JUNK.sub('', pattern)
+    pattern = _CASE_CLASS.sub(
+        lambda m: m.group(1).lower() if m.group(1).lower() == m.group(2).lower() else m.group(0), pattern)
+    keys = set()
+    for host in _host_parts(pattern):
+        for regex, replacement in _HOST_REWRITES:
+            host = regex.sub(replacement, host)
+        if _PARTIAL_LABEL.search(host):
+            return None
+        host_keys = set()
+        for m in _LABEL.finditer(host):
+            label = m.group().lower()
+            if label in COMMON_LABELS:
+                continue
+            # A one-letter word is only a complete label if a dot follows; 'y(?:ou)?tube' is not
+            if len(label) == 1 and not host.startswith('.', m.end()):
+                return None
+            host_keys.add(label[:2])
+        if not host_keys:
+            return None
+        keys |= host_keys
+    return keys or None
+
+
+class URLDispatcher:
+    """
+    Routes URLs to a yt-dlp extractor without network access.
+    Extractors are indexed by the host labels their _VALID_URL can match, so a lookup only
+    tries the few candidates for the URL's host instead of every extractor in order.
+    """
+
+    def __init__(self):
+        self._extractors = ()
+        self._index = {}
+        self._wildcard = ()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._extractors)
+
+    def build(self) -> None:
+        """
+        Load the extractor list, build the host index and compile every _VALID_URL.
+        Safe to call more than once; only the first call does the work.
+        """
+        with self._lock:
+            if self._extractors:
+                return
+            from yt_dlp.extractor import gen_extractor_classes
+
+            extractors = [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic']
+            index = {}
+            wildcard = []
+            for pos, ie in enumerate(extractors):
+                if not ie._VALID_URL:
+                    continue
+                patterns = ie._VALID_URL if isinstance(ie._VALID_URL, (list, tuple)) else [ie._VALID_URL]
+                keys = set()
+                for pattern in patterns:
+                    pattern_keys = _host_keys(pattern)
+                    if pattern_keys is None:
+                        keys = None
+                        break
+                    keys |= pattern_keys
+                if keys is None:
+                    wildcard.append(pos)
+                else:
+                    for key in keys:
+                        index.setdefault(key, []).append(pos)
+                # Compile the pattern now rather than on the first request that hits it
+                ie.suitable('')
+
+            self._index = {key: tuple(positions) for key, positions in index.items()}
+            self._wildcard = tuple(wildcard)
+            self._extractors = tuple(extractors)
+
+    def match(self, url: str):
+        """
+        Return the extractor class yt-dlp would pick for url, or None for the generic extractor.
+        """
+        if not self._extractors:
+            self.build()
+        host = urlsplit(url).hostname or ''
+        candidates = set(self._wildcard)
+        for label in host.split('.'):
+            if label not in COMMON_LABELS:
+                candidates.update(self._index.get(label[:2], ()))
+        # yt-dlp picks the first suitable extractor, so keep its ordering
+        for pos in sorted(candidates):
+            ie = self._extractors[pos]
+            if ie.suitable(url):
+                return ie
+        return None
+
+    def classify(self, url: str) -> Route:
+        """
+        Classify url without network access. The returned Route keeps url unchanged.
+        """
+        stripped = strip_tracking(url)
+        kind = media_kind(urlsplit(stripped).path)
+        if kind:
+            return Route(kind, url, site=canonical_host(url))
+        ie = self.match(stripped)
+        if ie is None:
+            return Route('generic', url, site=canonical_host(url))
+        return Route('extractor', url, ie.ie_key(), ie.get_temp_id(stripped), _extractor_site(ie))
+
+    def resolve(self, url: str) -> Route:
+        """
+        Classify url, falling back to a HEAD request when no extractor or extension matches.
+        """
+        route = self.classify(url)
+        if route.kind != 'generic':
+            return route
+        from downloader import get_image_info
+
+        content_type = get_image_info(route.url).get('content_type', '')
+        kind = content_type.split('/')[0]
+        if kind in ('image', 'video', 'audio'):
+            return route._replace(kind=kind)
+        return route
+
+
+# Global instance
+url_dispatcher = URLDispatcher()
@@ -0,0 +1,126 @@
+"""
+Offline analyzer for the job traces written by tracing.py.
+
+Reads the span file, the files of queue workers next to it (see tracing.worker_trace_file)
+and their rotated backups, then prints per-stage latency percentiles
+and the slowest jobs with their stage breakdown.
+
+    python scripts/analyze_traces.py [path] [--slowest N] [--since HOURS]
+
+path defaults to $TRACE_FILE or traces/spans.jsonl.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import time
+from collections import defaultdict
+
+# Pipeline order, used to sort the report; unknown stages go last
+STAGES = ('route', 'analysis', 'info_preview', 'format_choice', 'enqueue', 'queue_wait', 'attempt', 'extract',
+          'download', 'postprocess', 'upload', 'cleanup', 'work', 'job')
+
+
+def load_spans(path: str, since: float = 0.0) -> list:
+    """
+    Load spans from path, the worker files next to it and their .N backups, skipping lines
+    that are not valid JSON (e.g. a line cut short by a crash).
+    """
+    spans = []
+    root, ext = os.path.splitext(path)
+    files = []
+    for base in [path] + sorted(glob.glob(f"{glob.escape(root)}-*{glob.escape(ext)}")):
+        files += [base] + sorted(glob.glob(f"{glob.escape(base)}.[0-9]*"))
+    for name in files:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                if span.get('start', 0) >= since:
+                    spans.append(span)
+    return spans
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, math.ceil(q / 100 * len(values)) - 1))
+    return values[rank]
+
+
+def stage_report(spans: list) -> list:
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    for span in spans:
+        durations[span['span']].append(span['duration'])
+        if span.get('status') != 'ok':
+            errors[span['span']] += 1
+
+    order = {name: i for i, name in enumerate(STAGES)}
+    rows = []
+    for name in sorted(durations, key=lambda n: (order.get(n, len(STAGES)), n)):
+        values = sorted(durations[name])
+        rows.append((name, len(values), errors[name], percentile(values, 50), percentile(values, 90),
+                     percentile(values, 99), values[-1]))
+    return rows
+
+
+def slowest_jobs(spans: list, count: int) -> list:
+    """
+    Return (job span, {stage: total seconds}) for the slowest finished jobs.
+    """
+    stages = defaultdict(lambda: defaultdict(float))
+    jobs = []
+    for span in spans:
+        if span['span'] == 'job':
+            jobs.append(span)
+        else:
+            stages[span['trace_id']][span['span']] += span['duration']
+    jobs.sort(key=lambda job: job['duration'], reverse=True)
+    return [(job, stages[job['trace_id']]) for job in jobs[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize job traces")
+    parser.add_argument('path', nargs='?', default=os.getenv('TRACE_FILE', os.path.join('traces', 'spans.jsonl')))
+    parser.add_argument('--slowest', type=int, default=10, help="number of slowest jobs to show")
+    parser.add_argument('--since', type=float, default=0, help="only spans from the last N hours")
+    args = parser.parse_args()
+
+    since = time.time() - args.since * 3600 if args.since else 0.0
+    spans = load_spans(args.path, since)
+    if not spans:
+        print(f"No spans found in {args.path}")
+        return
+
+    print(f"{len(spans)} spans from {args.path}\n")
+    print(f"{'stage':<14}{'count':>7}{'errors':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for name, count, errors, p50, p90, p99, worst in stage_report(spans):
+        print(f"{name:<14}{count:>7}{errors:>8}{p50:>8.2f}s{p90:>8.2f}s{p99:>8.2f}s{worst:>8.2f}s")
+
+    jobs = slowest_jobs(spans, args.slowest)
+    if jobs:
+        print(f"\nSlowest {len(jobs)} jobs:")
+    for job, stages in jobs:
+        attrs = job.get('attrs', {})
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(job['start']))
+        print(f"\n{job['trace_id']}  {job['duration']:.2f}s  {job['status']}  {started}  {attrs.get('url', '')}")
+        details = ', '.join(f"{key}={attrs[key]}" for key in ('extractor', 'format', 'bytes', 'retries') if key in attrs)
+        if details:
+            print(f"  {details}")
+        if job.get('error'):
+            print(f"  error: {job['error']}")
+        breakdown = sorted(stages.items(), key=lambda item: item[1], reverse=True)
+        print('  ' + ', '.join(f"{name} {seconds:.2f}s" for name, seconds in breakdown))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from config import BOT_STATE_FILE, START_TIME
+from routing import url_dispatcher
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTION = (
+    "A Telegram bot for downloading videos and images from URLs. "
+    "Supports platforms like YouTube, TikTok, Instagram, Facebook, and more. "
+    "Send URLs to download media easily!\n\nCreated by GhostScript."
+)
+SHORT_DESCRIPTION = "Download videos and images from URLs. Created by GhostScript."
+
+
+class Readiness:
+    """
+    Startup checks for the readiness probe. Liveness (/health) only says the process is up;
+    readiness says every check has passed: the bot is polling and the extractors are loaded.
+    """
+
+    def __init__(self, checks: tuple = ('polling', 'extractors')):
+        self.checks = {name: None for name in checks}
+        self._lock = threading.Lock()
+
+    def mark(self, name: str) -> None:
+        """
+        Record that a check passed, with the seconds since process start.
+        """
+        with self._lock:
+            self.checks[name] = round(time.time() - START_TIME, 3)
+
+    @property
+    def ready(self) -> bool:
+        return all(value is not None for value in self.checks.values())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'ready': self.ready, 'checks': dict(self.checks)}
+
+
+def warm_up() -> None:
+    """
+    Load yt-dlp and build the URL routing index. Blocking: run it in an executor after polling starts.
+    Requests that arrive earlier wait for the index inside url_dispatcher instead of failing.
+    """
+    started = time.perf_counter()
+    try:
+        import yt_dlp  # noqa: F401
+        import requests  # noqa: F401
+        url_dispatcher.build()
+    except Exception:
+        logger.exception("Loading extractors failed; the bot stays not ready")
+        return
+    readiness.mark('extractors')
+    logger.info("Extractors loaded in %.2fs", time.perf_counter() - started)
+
+
+def _load_state(path: str) -> dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(path: str, state: dict) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+async def update_descriptions(bot, path: str = BOT_STATE_FILE) -> bool:
+    """
+    Set the bot's description and short description only if their text changed since the last
+    successful update, tracked by hash in the state file. Returns True if the API was called.
+    """
+    digest = hashlib.sha256(f"{DESCRIPTION}\0{SHORT_DESCRIPTION}".encode()).hexdigest()
+    state = _load_state(path) if path else {}
+    if state.get('descriptions') == digest:
+        return False
+    await bot.set_my_description(DESCRIPTION)
+    await bot.set_my_short_description(SHORT_DESCRIPTION)
+    if path:
+        try:
+            _save_state(path, {**state, 'descriptions': digest})
+        except OSError as e:
+            logger.warning("Could not save bot state to %s: %s", path, e)
+    return True
+
+
+# Global instance
+readiness = Readiness()
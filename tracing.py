@@ -0,0 +1,177 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from config import TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUPS, TRACE_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class SpanWriter:
+    """
+    Appends span records to a rotating JSONL file.
+    Records are queued by the caller and written in batches by a background thread,
+    so recording a span never does file I/O on the event loop.
+    """
+
+    def __init__(self, path: str, max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS,
+                 flush_interval: float = TRACE_FLUSH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, record: dict) -> None:
+        if not self.path:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='span-writer', daemon=True)
+                    self._thread.start()
+        self._queue.put(record)
+
+    def flush(self) -> None:
+        """
+        Write everything queued so far from the calling thread.
+        """
+        batch = self._drain()
+        if batch:
+            self._write(batch)
+
+    def _drain(self) -> list:
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _run(self) -> None:
+        while True:
+            # Let records accumulate so they go out in one write
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _write(self, batch: list) -> None:
+        with self._lock:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    self._rotate()
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(record, default=str) + '\n' for record in batch))
+            except OSError as e:
+                logger.warning("Could not write %d spans to %s: %s", len(batch), self.path, e)
+
+    def _rotate(self) -> None:
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class Span:
+    """
+    A timed stage of a job. Use as a context manager; an exception marks it as failed.
+    """
+
+    def __init__(self, trace, name: str, attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        status, error = 'ok', None
+        if exc_type is not None:
+            status = 'cancelled' if exc_type.__name__ == 'CancelledError' else 'error'
+            error = str(exc) or exc_type.__name__
+        self.trace.record(self.name, self.start, time.time(), status=status, error=error, **self.attrs)
+        return False
+
+
+class Trace:
+    """
+    Spans of one job (URL -> analysis -> format choice -> download -> postprocess -> upload -> cleanup),
+    tied together by trace_id. finish() writes the whole-job span with the job attributes.
+    """
+
+    def __init__(self, writer=None, trace_id: str = None, **attrs):
+        """
+        trace_id: continue a trace started elsewhere, e.g. by the bot for a job a worker runs
+        """
+        self.writer = writer or span_writer
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.attrs = attrs
+        self.start = time.time()
+        self.finished = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.writer.path)
+
+    def span(self, name: str, **attrs) -> Span:
+        return Span(self, name, attrs)
+
+    def record(self, name: str, start: float, end: float, status: str = 'ok', error=None, **attrs) -> None:
+        """
+        Record a span with explicit epoch timestamps, e.g. from times captured in yt-dlp hooks.
+        """
+        record = {
+            'trace_id': self.trace_id,
+            'span': name,
+            'start': round(start, 6),
+            'duration': round(max(0.0, end - start), 6),
+            'status': status,
+            'attrs': attrs,
+        }
+        if error:
+            record['error'] = error
+        self.writer.submit(record)
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        self.attrs[name] = self.attrs.get(name, 0) + amount
+
+    def finish(self, status: str = 'ok', error=None) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        self.record('job', self.start, time.time(), status=status, error=error, **self.attrs)
+
+
+def worker_trace_file(path: str, worker: str) -> str:
+    """
+    Trace file of one worker process next to the bot's, e.g. traces/spans-host-123.jsonl for
+    worker 'host:123', so processes never append to or rotate the same file.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}-{worker.replace(':', '-').replace(os.sep, '-')}{ext}"
+
+
+# Global instances; NO_TRACE accepts the same calls as a Trace and records nothing
+span_writer = SpanWriter(TRACE_FILE)
+NO_TRACE = Trace(SpanWriter(''))
+atexit.register(span_writer.flush)
@@ -37,6 +37,15 @@ def sanitize_filename(filename: str) -> str:
     """
     return re.sub(r'[<>:"/\\|?*]', '_', filename)
 
+def upload_filename(filepath: str, title: str = None) -> str:
+    """
+    Name to send a downloaded file under: its title with the file's extension.
+    Files on disk have unique generated names that users should not see.
+    """
+    if not title:
+        return os.path.basename(filepath)
+    return sanitize_filename(title)[:200] + os.path.splitext(filepath)[1]
+
 def is_image_url(url: str) -> bool:
     """
     Check if URL points to an image based on file extension.
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from config import BOT_TOKEN, LOG_LEVEL, TELEGRAM_API_URL, JOB_QUEUE, WORKER_CONCURRENCY, QUEUE_POLL_INTERVAL, QUEUE_HEARTBEAT_INTERVAL
+from jobqueue import job_queue, DONE, FAILED, CANCELLED
+from downloader import downloader
+from bandwidth import ThrottledInputFile
+from tracing import Trace, span_writer, worker_trace_file
+from progress import JobProgress
+from startup import warm_up
+from utils import cleanup_file, get_file_size, upload_filename
+
+logger = logging.getLogger(__name__)
+
+# Job outcome -> span status, as the bot records it for in-process jobs
+TRACE_STATUS = {DONE: 'ok', FAILED: 'error', CANCELLED: 'cancelled'}
+
+
+class Worker:
+    """
+    Download worker: claims video/audio jobs the bot put in the job queue, downloads them with
+    VideoDownloader, sends the file to the user's chat and publishes progress with its heartbeats.
+    Run as many worker processes (or containers sharing the queue file) as there are CPUs to spare.
+    """
+
+    def __init__(self, bot: Bot, queue, name: str, concurrency: int = WORKER_CONCURRENCY):
+        self.bot = bot
+        self.queue = queue
+        self.name = name
+        self.concurrency = concurrency
+        self.processed = 0
+        # Queue calls get their own threads: downloads hold the default executor's threads for
+        # minutes, and a heartbeat stuck behind them would let the lease run out
+        self._queue_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='queue')
+
+    async def _queue_call(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._queue_executor, method, *args)
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._slot() for _ in range(self.concurrency)))
+
+    async def _slot(self) -> None:
+        while True:
+            job = await self._queue_call(self.queue.claim, self.name)
+            if job is None:
+                await asyncio.sleep(QUEUE_POLL_INTERVAL)
+                continue
+            await self.process(job)
+
+    async def process(self, job) -> None:
+        """
+        Run one job to the end and record its outcome in the queue.
+        """
+        payload = job.payload
+        trace = Trace(trace_id=payload.get('trace_id'), user_id=job.user_id, url=payload['url'], job_id=job.id,
+                      worker=self.name, attempt=job.attempts)
+        claimed = time.time()
+        trace.record('queue_wait', job.created, claimed)
+        # Updated by the download thread, published by the heartbeat
+        progress = JobProgress()
+        lease = {'stopped': False}
+        # Download and upload run in one task, so a cancel or a lost lease stops whichever is running
+        task = asyncio.create_task(self._deliver(job, progress, trace))
+        keeper = asyncio.create_task(self._keep_alive(job, task, progress, lease))
+        status, error = DONE, None
+        try:
+            await task
+            self.processed += 1
+        except asyncio.CancelledError:
+            if not lease['stopped']:
+                # Worker shutdown: hand the job to another worker
+                await self._queue_call(self.queue.release, job.id, self.name)
+                raise
+            status = CANCELLED
+        except Exception as e:
+            status, error = FAILED, str(e)
+            if not isinstance(e, ValueError):
+                logger.exception("Job %s failed", job.id)
+        finally:
+            keeper.cancel()
+            if not task.done():
+                task.cancel()
+        trace.record('work', claimed, time.time(), status=TRACE_STATUS[status], error=error, **trace.attrs)
+        await self._queue_call(self.queue.finish, job.id, self.name, status, error)
+
+    async def _deliver(self, job, progress: JobProgress, trace: Trace) -> None:
+        """
+        Download the job's file and send it to the user's chat.
+        """
+        payload = job.payload
+        format_type = payload['format_type']
+        filepath = None
+        try:
+            filepath, info = await downloader.download_video(payload['url'], format_type, payload['quality'], progress, trace)
+            title = info.get('title', payload.get('default_title') or 'Downloaded video')
+            media = ThrottledInputFile(filepath, format_type, filename=upload_filename(filepath, title))
+            duration = info.get('duration')
+            if payload.get('with_duration') and duration:
+                title += f" ({int(duration) // 60}:{int(duration) % 60:02d})"
+            send = self.bot.send_audio if format_type == 'audio' else self.bot.send_video
+            with trace.span('upload', method=send.__name__, bytes=get_file_size(filepath)):
+                await send(job.chat_id, media, caption=title)
+        finally:
+            if filepath:
+                with trace.span('cleanup'):
+                    cleanup_file(filepath)
+
+    async def _keep_alive(self, job, task: asyncio.Task, progress: JobProgress, lease: dict) -> None:
+        """
+        Renew the job's lease, publishing progress that changed since the last heartbeat,
+        and stop the job's download or upload if the job was cancelled or the lease was lost.
+        """
+        published = None
+        while True:
+            await asyncio.sleep(QUEUE_HEARTBEAT_INTERVAL)
+            latest = progress.snapshot()
+            update = latest if latest != published else None
+            if not await self._queue_call(self.queue.heartbeat, job.id, self.name, update):
+                lease['stopped'] = True
+                task.cancel()
+                return
+            published = latest
+
+
+async def main():
+    """
+    Entry point for a download worker process.
+    """
+    if not job_queue:
+        raise ValueError("Set JOB_QUEUE to the job queue file shared with the bot to run a worker.")
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    bot = Bot(token=BOT_TOKEN, session=session)
+    worker = Worker(bot, job_queue, f"{socket.gethostname()}:{os.getpid()}")
+    if span_writer.path:
+        span_writer.path = worker_trace_file(span_writer.path, worker.name)
+    # On SIGTERM (container stop), release running jobs to other workers instead of waiting for their leases
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    # Load the extractors before taking jobs, so the first job doesn't pay for it
+    await loop.run_in_executor(None, warm_up)
+    logging.info("Worker %s processing %s with %d slot(s)", worker.name, JOB_QUEUE, worker.concurrency)
+    try:
+        await worker.run()
+    except asyncio.CancelledError:
+        logging.info("Worker %s stopped after %d job(s)", worker.name, worker.processed)
+    finally:
+        await bot.session.close()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=getattr(logging, LOG_LEVEL.upper(), logging.INFO))
+    asyncio.run(main())